@@ -0,0 +1,88 @@
+"""
+Cold start costs: how long `import lloam` takes, whether it pulls in the
+provider SDK, and the latency of the first and second requests against a
+local stand-in server. Each measurement runs in a fresh interpreter.
+
+    python benchmarks/startup.py
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+from lloam.standin import StandinServer
+
+
+RUNS = 5
+
+IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "openai": "openai" in sys.modules,
+    "threads": __import__("threading").active_count(),
+}}))
+"""
+
+FIRST_REQUEST = """
+import json, time
+from functools import partial
+started = time.perf_counter()
+import lloam
+from lloam.streaming import stream_chat_completion
+imported = time.perf_counter()
+
+lloam.set_backend(partial(stream_chat_completion, base_url={url!r}, api_key="standin"))
+
+def first_chunk(prompt):
+    begun = time.perf_counter()
+    completion = lloam.completion(prompt)
+    next(iter(completion.stream()))
+    first = time.perf_counter() - begun
+    completion.result()
+    return first
+
+first = first_chunk("hello")
+second = first_chunk("hello again")
+print(json.dumps({{
+    "import": imported - started,
+    "first": first,
+    "second": second,
+    "total": time.perf_counter() - started,
+}}))
+"""
+
+
+def run(code):
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def median(results, key):
+    return statistics.median(result[key] for result in results) * 1000
+
+
+def main():
+    print(f"median of {RUNS} fresh interpreters\n")
+
+    for module in ("openai", "lloam"):
+        results = [run(IMPORT.format(module=module)) for _ in range(RUNS)]
+        print(
+            f"import {module:<8} {median(results, 'seconds'):8.1f} ms"
+            f"   openai loaded: {results[0]['openai']}, threads: {results[0]['threads']}"
+        )
+
+    with StandinServer(reply="Loam is a fertile mix of sand, silt and clay.") as server:
+        results = [run(FIRST_REQUEST.format(url=server.url)) for _ in range(RUNS)]
+
+    print()
+    print(f"import lloam              {median(results, 'import'):8.1f} ms")
+    print(f"first request, 1st chunk  {median(results, 'first'):8.1f} ms")
+    print(f"second request, 1st chunk {median(results, 'second'):8.1f} ms")
+    print(f"start to two responses    {median(results, 'total'):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
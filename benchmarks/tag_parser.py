@@ -0,0 +1,119 @@
+"""
+Throughput of the incremental tag parser over multi-megabyte synthetic
+streams with adversarial chunk boundaries.
+
+    python benchmarks/tag_parser.py
+"""
+import random
+import re
+import time
+
+from lloam.tags import TagParser
+
+
+TAGS = ("thought", "action", "note")
+
+
+def synthetic_stream(size, seed=0):
+    rng = random.Random(seed)
+    words = ["loam", "silt", "clay", "a < b", "x<y", "1 > 0", "<<", "</", "<not a tag", "sand"]
+
+    def sentence(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    pieces = []
+    total = 0
+    while total < size:
+        opened = []
+        for i in range(rng.randint(1, 4)):
+            name = rng.choice(TAGS)
+            opened.append(name)
+            pieces.append(f'<{name} id="{i}" kind=\'step\'>')
+            pieces.append(sentence(rng.randint(1, 30)))
+        for name in reversed(opened):
+            pieces.append(f"</{name}>")
+        pieces.append(sentence(rng.randint(0, 10)))
+
+        total += sum(len(p) for p in pieces[-2 * len(opened) - 1 - len(opened):])
+    return "".join(pieces)
+
+
+def chunkings(text, seed=0):
+    rng = random.Random(seed)
+
+    def single_characters():
+        return list(text)
+
+    def random_sizes():
+        chunks, i = [], 0
+        while i < len(text):
+            n = rng.randint(1, 8)
+            chunks.append(text[i:i + n])
+            i += n
+        return chunks
+
+    def split_inside_tags():
+        # break right after every "<" and right before every ">"
+        return [c for c in re.split(r"(?<=<)|(?=>)", text) if c]
+
+    def token_like():
+        return re.findall(r"\s*\S{1,4}", text)
+
+    return {
+        "1 char": single_characters,
+        "random 1-8": random_sizes,
+        "split in tags": split_inside_tags,
+        "token-like": token_like,
+    }
+
+
+def run_parser(chunks, whole=False):
+    parser = TagParser(TAGS, whole=whole)
+    n = 0
+    for chunk in chunks:
+        n += len(parser.feed(chunk))
+    n += len(parser.close())
+    return n
+
+
+def run_naive(chunks, tags=TAGS):
+    """
+    The previous approach: grow a buffer and re-search it on every chunk
+    """
+    opening = re.compile("(" + "|".join(re.escape(f"<{t}") for t in tags) + ")")
+    buffer = ""
+    n = 0
+    for chunk in chunks:
+        buffer += chunk
+        match = opening.search(buffer)
+        if match and buffer.find(">", match.end()) != -1:
+            n += 1
+    return n
+
+
+def bench(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    size = 4 * 1024 * 1024
+    text = synthetic_stream(size)
+    print(f"stream: {len(text) / 1e6:.1f} MB")
+
+    for name, make_chunks in chunkings(text).items():
+        chunks = make_chunks()
+        for whole in (False, True):
+            elapsed = bench(run_parser, chunks, whole)
+            mode = "whole" if whole else "stream"
+            print(f"{name:>14} {mode:>6}: {len(chunks):>9} chunks {elapsed:6.2f}s {len(text) / elapsed / 1e6:6.1f} MB/s")
+
+    print()
+    print("scaling vs. re-searching a growing buffer (random 1-8 chunks):")
+    for kb in (64, 256, 1024):
+        sample = text[:kb * 1024]
+        chunks = chunkings(sample)["random 1-8"]()
+        parser = bench(run_parser, chunks)
+        naive = bench(run_naive, chunks)
+        print(f"{kb:>5} KB: parser {parser:6.3f}s  naive {naive:6.3f}s")
@@ -0,0 +1,42 @@
+import time
+
+import lloam
+from lloam.endpoints import Endpoint, EndpointPool
+from lloam.standin import StandinServer
+
+
+# three local stand-ins for OpenAI-compatible servers: fast, slow and broken
+fast = StandinServer(reply="Loam is a fertile mix of sand, silt and clay.", token_delay=0.01).start()
+slow = StandinServer(reply="Loam is a fertile mix of sand, silt and clay.", ttft=0.5, token_delay=0.01).start()
+broken = StandinServer(fail=True).start()
+
+pool = EndpointPool(
+    [
+        Endpoint(broken.url, api_key="local", name="broken"),
+        Endpoint(fast.url, api_key="local", name="fast"),
+        Endpoint(slow.url, api_key="local", name="slow", weight=0.5),
+    ],
+    strategy="latency",
+    failure_threshold=2,
+    cooldown=5.0
+)
+lloam.set_backend(pool.stream)
+
+
+start = time.time()
+answers = [lloam.completion("What's loam?") for _ in range(40)]
+answers = [str(answer) for answer in answers]
+print(answers[0])
+print(f"{len(answers)} completions in {time.time() - start:.2f}s")
+
+# requests that hit the broken server failed over before streaming anything
+for endpoint in pool.report():
+    print(endpoint)
+
+# output:
+
+# Loam is a fertile mix of sand, silt and clay.
+# 40 completions in 1.17s
+# {'name': 'broken', 'state': 'open', 'outstanding': 0, 'requests': 16, 'failures': 16, ...}
+# {'name': 'fast', 'state': 'closed', 'outstanding': 0, 'requests': 27, 'failures': 0, ...}
+# {'name': 'slow', 'state': 'closed', 'outstanding': 0, 'requests': 13, 'failures': 0, ...}
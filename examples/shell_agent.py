@@ -13,28 +13,37 @@ class ShellAgent(lloam.Agent):
         self.allowed_commands = ["ls", "cat", "touch", "echo", "exit"]
 
         self.thoughts = []
-        self.command_history = ""
+        # keeps each step's prompt bounded no matter how long the agent runs
+        self.command_history = lloam.Context(max_tokens=2000, policy="summarize")
 
     def start(self):
+        action = self.choose_action()
         while True:
-            action = self.choose_action()
+            # the tool starts as soon as [actions] finishes
+            observation = self.run(action.future("actions"))
             self.thoughts.append(action.thought)
 
-            cmd = backticks(action.actions)[0]
+            cmd = self.parse_command(action.actions)
             print(cmd)
 
-            if cmd == "":
-                continue
-
             if cmd.startswith("exit"):
                 return
 
-            observation = self.run(cmd)
-            self.command_history += f"\n$ {cmd}\n{observation}"
+            step = f"$ {cmd}\n" if cmd else ""
+
+            # when the output is predictable, the next step starts before the command returns
+            next_action = self.speculate(
+                observation,
+                lambda output: self.choose_action(step + output),
+                predict=self.predict_output(cmd),
+            )
+            action = next_action.result()
+
+            self.command_history.append(step + observation.result())
 
 
     @lloam.prompt
-    def choose_action(self):
+    def choose_action(self, last=""):
         """
         {self.goal}
         I'm in the directory {self.root_dir}.
@@ -44,6 +53,7 @@ class ShellAgent(lloam.Agent):
         Here's everything I've done so far:
         ```
         {self.command_history}
+        {last}
         ```
 
         Concisely, what should I do next?
@@ -53,22 +63,37 @@ class ShellAgent(lloam.Agent):
         [actions]
         """
 
-    def run(self, command):
-        command = command.strip().split()
+    def predict_output(self, cmd):
+        """
+        What a command will print, if that's known before it runs
+        """
+        command = cmd.split()
+        if not command or command[0] == "touch":
+            return ""
+        if command[0] == "echo":
+            return " ".join(command[1:]) + "\n"
+        return None
+
+    def parse_command(self, actions):
+        commands = backticks(actions)
+        return commands[0] if commands else ""
+
+    @lloam.tool
+    def run(self, actions):
+        command = self.parse_command(actions).strip().split()
+
+        if not command or command[0] == "exit":
+            return ""
 
-        try:
-            if command[0] not in self.allowed_commands:
-                return f"Command not allowed: {command[0]}"
-        except:
-            breakpoint()
+        if command[0] not in self.allowed_commands:
+            return f"Command not allowed: {command[0]}"
 
-        result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         output = result.stdout if result.returncode == 0 else result.stderr
 
         return output
 
 
-
 if __name__ == "__main__":
     import os
     examples_dir = os.path.dirname(os.path.realpath(__file__))
@@ -82,3 +107,5 @@ if __name__ == "__main__":
     agent = ShellAgent(task, root_dir)
     agent.start()
 
+    print(agent.speculation_stats.report())
+
@@ -1,5 +1,10 @@
-from .completions import completion
+from .completions import completion, set_backend
 from .prompt import prompt
 from .agent import Agent
+from .context import Context
+from .tools import tool
+from .validators import Validator, ValidationError
+from .stats import model_stats
+from .embeddings import embed
 
-__all__ = ["completion", "prompt", "Agent"]
+__all__ = ["completion", "set_backend", "prompt", "Agent", "Context", "tool", "Validator", "ValidationError", "model_stats", "embed"]
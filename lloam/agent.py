@@ -1,29 +1,128 @@
 import threading
-import os
-import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import update_wrapper
 
 from .prompt import Prompt
 from .completions import Completion, CompletionStatus
+from .logs import Logger
+from .progress import ProgressRegistry, ProgressRenderer
+from .tools import shell
+from .speculation import SpeculationStats, speculate
+
+
+_lazy_lock = threading.Lock()
+
+
+class lazy_attribute:
+    """
+    An attribute made by the decorated method on first use and stored in
+    the instance's `_<name>`. Subclasses don't always call Agent.__init__,
+    so the agent's state can't be created there.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        update_wrapper(self, factory)
+
+    def __set_name__(self, owner, name):
+        self.key = f"_{name}"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.key)
+        if value is None:
+            with _lazy_lock:
+                value = instance.__dict__.get(self.key)
+                if value is None:
+                    value = instance.__dict__[self.key] = self.factory(instance)
+        return value
 
 
 class Agent:
     def __init__(self):
         self.lock = threading.Lock()
-        self.logs = []
-
         self.silent = False
 
 
-    def log(self, message, level="info"):
-        with self.lock:
-            self.logs.append({
-                "level": level,
-                "message": message,
-                "timestamp": time.time()
-            })
+    @lazy_attribute
+    def logger(self) -> Logger:
+        return Logger()
+
+
+    @property
+    def logs(self) -> list:
+        """
+        A copy of the most recent log records (bounded by `logger.records.maxlen`)
+        """
+        return list(self.logger.records)
+
+
+    @property
+    def silent(self):
+        return not self.logger.echo
+
+    @silent.setter
+    def silent(self, silent):
+        self.logger.echo = not silent
+
+
+    def configure_logging(self, **kwargs):
+        """
+        Replace the agent's logger, see `lloam.logs.Logger` for options
+        """
+        old = self.__dict__.get("_logger")
+        self.__dict__["_logger"] = Logger(**kwargs)
+        if old is not None:
+            old.close()
+
+
+    def log(self, message, level="info", **fields):
+        self.logger.log(message, level, **fields)
+
+
+    max_tool_workers = 8
+
+    @lazy_attribute
+    def tool_pool(self) -> ThreadPoolExecutor:
+        """
+        Bounded thread pool that the agent's tools run on
+        """
+        return ThreadPoolExecutor(max_workers=self.max_tool_workers)
+
+
+    def shell(self, command, cwd=None, timeout=None) -> Future:
+        """
+        Run a shell command without blocking the agent, see `lloam.tools.shell`
+        """
+        return shell(command, cwd=cwd, timeout=timeout)
+
 
-            if not self.silent:
-                print(f"[{level}] {message}")
+    @lazy_attribute
+    def speculation_stats(self) -> SpeculationStats:
+        return SpeculationStats()
+
+
+    def speculate(self, observation, next_step, predict=None, equivalent=None) -> Future:
+        """
+        Start the next step before a tool result arrives, with a predicted
+        result. It's kept if the prediction was right (or `equivalent`),
+        otherwise restarted with the real result. See `lloam.speculation.speculate`.
+
+            next_action = self.speculate(
+                output,                                      # a tool's Future
+                lambda output: self.choose_action(output),
+                predict="",
+            )
+            action = next_action.result()
+
+        Hit rate and time saved are in `self.speculation_stats.report()`.
+        Steps started once the observation is in run on `self.tool_pool`.
+        """
+        return speculate(
+            observation, next_step, predict=predict, equivalent=equivalent,
+            stats=self.speculation_stats, executor=self.tool_pool
+        )
 
 
     def get_lloam_members(self) -> dict:
@@ -67,104 +166,46 @@ class Agent:
         return result
 
 
-    # SOME ARTSY SHITE THAT WON'T WORK RN
-    # 
-    # def format_progress(self):
-    #     def expand_agents(obj, seen):
-    #         obj_id = id(obj)
-    #         if obj_id in seen:
-    #             return None  # Avoid processing the same object again
-    #         seen.add(obj_id)
-
-    #         if isinstance(obj, Agent):
-    #             obj_members = obj.get_lloam_members()
-    #             return {key: expand_agents(value, seen) for key, value in obj_members.items()}
-    #         elif isinstance(obj, list):
-    #             return [expand_agents(item, seen) for item in obj]
-    #         elif isinstance(obj, dict):
-    #             return {k: expand_agents(v, seen) for k, v in obj.items()}
-    #         else:
-    #             return obj  # Leave other types unchanged
-
-    #     seen = set()
-    #     seen.add(id(self))
-    #     members = self.get_lloam_members()
-    #     members = {key: expand_agents(value, seen) for key, value in members.items()}
-
-    #     done = "■"
-    #     waiting = "□"
-
-    #     result = []
-
-    #     def process_member(kk, vv):
-    #         if isinstance(vv, dict):
-    #             result.append(f"[")
-    #             for k, v in vv.items():
-    #                 process_member(k, v)
-
-    #             result.append("]")
-
-    #         elif isinstance(vv, list):
-    #             result.append("[")
-    #             for v in vv:
-    #                 process_member(None, v)
-
-    #             result.append("]")
-
-    #         elif isinstance(vv, Prompt):
-    #             n_complete, n_waiting = vv.progress()
-
-    #             result.append(n_complete * done)
-    #             result.append(n_waiting * waiting)
-
-    #         elif isinstance(vv, Completion):
-    #             status = vv.status
-    #             if status == CompletionStatus.FINISHED:
-    #                 return
-    #             result.append(f"[{waiting}]")
-    #         else:
-    #             return
-
-    #     process_member(None, members)
-
-    #     return "".join(result)
-
-
-    # def observe(self):
-
-    #     stop_event = threading.Event()
-
-    #     def display_progress():
-    #         try:
-    #             while not stop_event.is_set():
-    #                 # Clear the screen
-    #                 os.system('cls' if os.name == 'nt' else 'clear')
-
-    #                 # Get the progress
-    #                 with self.lock:
-    #                     progress = self.format_progress()
-    #                     print(progress)
-    #                     print()
-    #                     print("(Press Enter to end observation)")
-
-    #                 # Wait for 0.1 seconds or until stop_event is set
-    #                 stop_event.wait(0.1)
-    #         except Exception as e:
-    #             print(f"An error occurred in the observation thread: {e}")
-
-
-    #     def wait_for_enter():
-    #         input()  # Wait for Enter key press
-    #         stop_event.set()  # Set the stop event when Enter is pressed
-
-    #     # Start the background thread to display progress
-    #     observer_thread = threading.Thread(target=display_progress, daemon=True)
-    #     observer_thread.start()
+    @lazy_attribute
+    def progress(self) -> ProgressRegistry:
+        """
+        Registry that the agent's prompts report their status transitions to
+        """
+        return ProgressRegistry()
 
-    #     # Start the thread to wait for Enter key press
-    #     input_thread = threading.Thread(target=wait_for_enter, daemon=True)
-    #     input_thread.start()
 
-    #     return stop_event
+    def format_progress(self) -> str:
+        return "\n".join(self.progress.format())
 
 
+    def observe(self, fps=10, stream=None):
+        """
+        Draw the agent's progress until Enter is pressed.
+        Returns an event that stops the observer when set.
+        """
+        stop_event = threading.Event()
+        renderer = ProgressRenderer(
+            self.progress,
+            stream=stream,
+            fps=fps,
+            footer=["", "(Press Enter to end observation)"]
+        )
+
+        def display_progress():
+            renderer.start()
+            stop_event.wait()
+            renderer.stop()
+
+        def wait_for_enter():
+            input()  # Wait for Enter key press
+            stop_event.set()  # Set the stop event when Enter is pressed
+
+        # Start the background thread to display progress
+        observer_thread = threading.Thread(target=display_progress, daemon=True)
+        observer_thread.start()
+
+        # Start the thread to wait for Enter key press
+        input_thread = threading.Thread(target=wait_for_enter, daemon=True)
+        input_thread.start()
+
+        return stop_event
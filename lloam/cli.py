@@ -0,0 +1,79 @@
+import argparse
+import importlib
+import os
+import sys
+from functools import partial
+
+
+def load_target(target):
+    """
+    Import `module:function` (or `package.module:function`)
+    """
+    module_name, _, attribute = target.partition(":")
+    if not attribute:
+        raise SystemExit(f"Expected module:function, got {target}")
+
+    # like `python -m`, modules in the working directory can be served
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    module = importlib.import_module(module_name)
+    try:
+        return getattr(module, attribute)
+    except AttributeError:
+        raise SystemExit(f"{module_name} has no attribute {attribute}")
+
+
+def serve(args):
+    from .completions import set_backend
+    from .serve import PromptServer
+    from .streaming import stream_chat_completion
+
+    prompts = {}
+    for target in args.targets:
+        fn = load_target(target)
+        prompts[fn.__name__] = fn
+
+    if args.standin is not None:
+        from .standin import StandinServer
+
+        reply = args.standin or None
+        standin = StandinServer(**({"reply": reply} if reply else {}), token_delay=args.standin_delay).start()
+        print(f"Stand-in backend on {standin.url}")
+        set_backend(partial(stream_chat_completion, base_url=standin.url, api_key="standin"))
+    elif args.base_url is not None:
+        set_backend(partial(stream_chat_completion, base_url=args.base_url, api_key=args.api_key))
+
+    server = PromptServer(
+        prompts, host=args.host, port=args.port,
+        max_concurrent=args.max_concurrent, max_pending=args.max_pending
+    )
+    print(f"Serving {', '.join('/' + name for name in prompts)} on http://{args.host}:{args.port}")
+    server.run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lloam")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Serve prompt functions over HTTP with streaming")
+    serve_parser.add_argument("targets", nargs="+", metavar="module:function")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--max-concurrent", type=int, default=16, help="Prompts running at once")
+    serve_parser.add_argument("--max-pending", type=int, default=64, help="Requests waiting for a slot before 429s")
+    serve_parser.add_argument("--base-url", help="An OpenAI-compatible server to use instead of the default")
+    serve_parser.add_argument("--api-key")
+    serve_parser.add_argument(
+        "--standin", nargs="?", const="", metavar="REPLY",
+        help="Answer from a local stand-in backend (echoes the prompt unless REPLY is given)"
+    )
+    serve_parser.add_argument("--standin-delay", type=float, default=0.05, help="Seconds between stand-in tokens")
+    serve_parser.set_defaults(run=serve)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 import asyncio
 import threading
-from concurrent.futures import Future
+import time
+from concurrent.futures import CancelledError, Future
 from enum import Enum
 import re
 
-from typing import List, Optional, Dict, Union
+from typing import Callable, List, Optional, Dict, Union
 
 from .streaming import stream_chat_completion
+from .tags import TagParser
+from .jsonstream import JSONStream
+from .validators import ValidationError, Validator
+from .stats import model_stats
+
+SELECTIONS = ("majority", "longest", "first")
+
 
 class CompletionStatus(Enum):
     PENDING = 0
@@ -18,19 +26,116 @@ class CompletionStatus(Enum):
 def completion(
     prompt: Union[str, List[str], List[Dict[str, str]]],
     stop: Optional[str|List[str]] = None,
-    model: str = "gpt-4o-mini"
+    model: Union[str, List[str]] = "gpt-4o-mini",
+    validate: Optional[Callable|List[Callable]] = None,
+    retries: int = 0,
+    n: int = 1,
+    select: Union[str, Callable] = "majority",
+    check: Optional[Callable] = None
 ):
     """
     :param prompt: A string, openai-style chat list, or list of strings
     :param stop: A stopping string, or list of stopping strings
+    :param model: A model, or a cascade of models to escalate through when
+        a validator or `check` fails
+    :param validate: A Validator (or list of them) checked while the text streams
+    :param retries: How many times to regenerate after a validator fails
+    :param n: Number of samples to generate in one request
+    :param select: How to pick the result from the samples: "majority",
+        "longest", "first" (to finish), or a function scoring each sample's text
+    :param check: A confidence check on the finished text, returning False escalates
 
     :return: A Completion object
     """
 
-    completion = Completion(prompt, stop)
+    completion = Completion(
+        prompt, stop, model=model, validate=validate, retries=retries,
+        n=n, select=select, check=check
+    )
     completion.start()
     return completion
 
+def set_backend(backend=None):
+    """
+    Use `backend` for all completions, an async generator function with the
+    signature of `streaming.stream_chat_completion` (None restores the default).
+    It's passed an `on_usage` callback, which it may ignore.
+    """
+    Completion.backend = staticmethod(backend) if backend is not None else None
+
+
+ROLES = ("system", "user", "assistant")
+
+
+class Role(str):
+    """
+    A `<|system|>`, `<|user|>` or `<|assistant|>` marker in a prompt,
+    everything after it (up to the next marker) is one message
+    """
+
+    def __new__(cls, role):
+        if role not in ROLES:
+            raise ValueError(f"Unknown role {role}, expected one of {ROLES}")
+        marker = super().__new__(cls, f"<|{role}|>")
+        marker.role = role
+        return marker
+
+
+def render_cell(cell):
+    if isinstance(cell, Future):
+        # e.g. a tool result, prompts wait for these before starting
+        return str(cell.result())
+    if isinstance(cell, (set, frozenset)):
+        # set order changes between processes, which would break prompt caching
+        return "{" + ", ".join(sorted(repr(x) for x in cell)) + "}"
+    return str(cell)
+
+
+def render_cells(cells):
+    """
+    Render prompt cells into a string, or into chat messages if they
+    contain Role markers.
+
+    Markers go on their own line. Every section but the last is stripped of
+    trailing whitespace, so unchanged sections stay byte-identical between
+    requests however the template is laid out (provider prompt caches only
+    match exact prefixes). An empty trailing assistant section is left out,
+    so the model simply replies.
+    """
+    if not any(isinstance(cell, Role) for cell in cells):
+        return "".join(render_cell(cell) for cell in cells)
+
+    sections = [[None, []]]
+    for cell in cells:
+        if isinstance(cell, Role):
+            sections.append([cell.role, []])
+        else:
+            sections[-1][1].append(render_cell(cell))
+
+    messages = []
+    for i, (role, parts) in enumerate(sections):
+        content = "".join(parts)
+        if role is not None and content.startswith("\n"):
+            # the marker's own line
+            content = content[1:]
+
+        last = i == len(sections) - 1
+        if not last:
+            content = content.rstrip()
+
+        if role is None:
+            # text before the first marker, usually just the template's indentation
+            if not content.strip():
+                continue
+            role = "user"
+        elif last and role == "assistant" and not content.strip():
+            continue
+
+        messages.append({"role": role, "content": content})
+
+    return messages
+
+
 # TODO: Rename to RunningCompletion, have it return Completion which inherits from str
 
 class Completion:
@@ -40,16 +145,31 @@ class Completion:
     """
     completions_loop = None
     completions_thread = None
+    _loop_lock = threading.Lock()
+    _loop_ready = threading.Event()
+    backend = None
 
 
-    def __init__(self, prompt, stop=None, model="gpt-4o-mini", temperature=0.9):
+    def __init__(
+        self, prompt, stop=None, model="gpt-4o-mini", temperature=0.9,
+        validate=None, retries=0, n=1, select="majority", check=None
+    ):
         super().__init__()
         self.prompt = prompt
-        self.status = CompletionStatus.PENDING
-        self.model = model
+        self._status = CompletionStatus.PENDING
+        self._subscribers = []
+        # a list of models is a cascade, each retry escalates to the next one
+        self.models = model if isinstance(model, list) else [model]
+        self.model = self.models[0]
         self.temperature = temperature
+        self.check = check
+        self.timings = []
+        # summed over requests, None once a request ends without reporting usage
+        self.usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
 
         self._done_callbacks = []
+        self._task = None
+        self._cancel_exception = None
         self._exception = None
         self._result = None
         self._done_event = threading.Event()
@@ -59,42 +179,129 @@ class Completion:
         if stop:
             self.add_stop(stop)
 
-        self._async_gen_func = stream_chat_completion
+        self.validators = []
+        if validate:
+            self.add_validator(validate)
+        self.retries = max(retries, len(self.models) - 1)
+        self.attempts = 0
+        self._first_chunk_at = None
+
+        if select not in SELECTIONS and not callable(select):
+            raise ValueError(f"select must be one of {SELECTIONS} or a function")
+        self.n = n
+        self.select = select
+        self.samples = []
+
+        self._async_gen_func = self.backend or stream_chat_completion
         self.chunks = []
+        # length of the joined chunks, so validators don't re-join them per chunk
+        self._length = 0
         self._chunks_lock = threading.Lock()
+        self._chunks_changed = threading.Condition(self._chunks_lock)
+        self._chunk_listeners = []
+
 
-        self._initialize_event_loop_in_thread()
+    @classmethod
+    def loop(cls):
+        """
+        The event loop completions run on, started on first use
+        """
+        if not cls._loop_ready.is_set():
+            cls._initialize_event_loop_in_thread()
+        return cls.completions_loop
 
 
     @classmethod
     def _initialize_event_loop_in_thread(cls):
-        if cls.completions_loop is not None:
-            return
-
-        def run_loop():
-            cls.completions_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(cls.completions_loop)
-            cls.completions_loop.run_forever()
+        with cls._loop_lock:
+            if cls.completions_thread is None:
+                def run_loop():
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    cls.completions_loop = loop
+                    # signals once the loop is actually running
+                    loop.call_soon(cls._loop_ready.set)
+                    loop.run_forever()
 
-        cls.completions_thread = threading.Thread(target=run_loop, daemon=True)
-        cls.completions_thread.start()
+                cls.completions_thread = threading.Thread(target=run_loop, name="lloam-completions", daemon=True)
+                cls.completions_thread.start()
 
-        # Wait for the loop to be created
-        while cls.completions_loop is None:
-            pass
+        cls._loop_ready.wait()
 
 
     def start(self):
         if self.prompt is None:
             raise ValueError("Prompt not set")
-        if isinstance(self.prompt, list) and isinstance(self.prompt[0], str):
+        if self.done():
+            # e.g. cancelled while it was waiting on the holes before it
+            return
+        if isinstance(self.prompt, list) and not isinstance(self.prompt[0], dict):
             if self in self.prompt:
                 self.prompt = self.prompt[:self.prompt.index(self)].copy()
 
-            self.prompt = "".join([str(x) for x in self.prompt])
+            try:
+                self.prompt = render_cells(self.prompt)
+            except Exception as e:
+                # e.g. a tool result or earlier hole in the prompt failed
+                self.set_exception(e)
+                self.status = CompletionStatus.ERROR
+                return
 
         self.status = CompletionStatus.RUNNING
-        asyncio.run_coroutine_threadsafe(self._run_generator(), self.completions_loop)
+        self._task = asyncio.run_coroutine_threadsafe(self._run_generator(), self.loop())
+
+
+    def cancel(self, exception=None):
+        """
+        Stop generating. The completion finishes with the text so far,
+        or fails with `exception` if one is given.
+        """
+        if self.done():
+            return
+
+        self._cancel_exception = exception
+        if self._task is None:
+            self._finish_cancelled()
+            return
+
+        self._task.cancel()
+        # the task may be cancelled before the generator gets to run
+        self._task.add_done_callback(lambda _: self._finish_cancelled())
+
+
+    def _finish_cancelled(self):
+        with self._callback_lock:
+            if self._done_event.is_set():
+                return
+
+        if self._cancel_exception is not None:
+            self.set_exception(self._cancel_exception)
+            self.status = CompletionStatus.ERROR
+        else:
+            self.status = CompletionStatus.FINISHED
+            with self._chunks_lock:
+                result = "".join(self.chunks)
+            self.set_result(result)
+
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        old = self._status
+        self._status = status
+        if old != status:
+            for fn in self._subscribers:
+                fn(self, old, status)
+
+
+    def subscribe(self, fn):
+        """
+        Call fn(completion, old_status, new_status) on every status transition
+        """
+        self._subscribers.append(fn)
 
 
     def add_stop(self, stop):
@@ -109,6 +316,15 @@ class Completion:
         else:
             raise ValueError("Stop must be a strings (or regexps) or list of strings")
 
+    def add_validator(self, validator):
+        if isinstance(validator, list):
+            for v in validator:
+                self.add_validator(v)
+        elif callable(validator):
+            self.validators.append(validator)
+        else:
+            raise ValueError("Validators must be callables (e.g. lloam.Validator) or lists of them")
+
     def __str__(self):
         return self.result()
 
@@ -124,20 +340,33 @@ class Completion:
 
 
     async def _run_generator(self):
-        gen = self._async_gen_func(
-            self.prompt, model=self.model, temperature=self.temperature
-        )
         try:
-            async for chunk in gen:
-
-                self._refresh_status(chunk)
-
-                if self.status == CompletionStatus.FINISHED:
-                    await gen.aclose()
+            while True:
+                self.model = self.models[min(self.attempts, len(self.models) - 1)]
+                started = time.monotonic()
+                self._first_chunk_at = None
+
+                violation = await self._run_attempt()
+                if self.done():
+                    # cancelled while the attempt was still streaming
+                    return
+                if violation is None and self.check is not None and not self.check(self.result_so_far()):
+                    violation = "failed its check"
+
+                self._record_timing(started, violation)
+                if violation is None:
                     break
 
+                if self.attempts >= self.retries:
+                    raise ValidationError(f"Completion {violation} (after {self.attempts + 1} attempts)")
+
+                # start over, streaming consumers see the new attempt from the start
                 with self._chunks_lock:
-                    self.chunks.append(chunk)
+                    self.chunks = []
+                    self._length = 0
+                    self.attempts += 1
+                self.status = CompletionStatus.RUNNING
+                self._notify_chunks()
 
             self.status = CompletionStatus.FINISHED
             with self._chunks_lock:
@@ -145,19 +374,268 @@ class Completion:
 
             self.set_result(result)
 
+        except asyncio.CancelledError:
+            self._finish_cancelled()
 
         except Exception as e:
+            if self.done():
+                return
             self.set_exception(e)
             self.status = CompletionStatus.ERROR
 
 
+    def _record_timing(self, started, violation):
+        latency = time.monotonic() - started
+        ttft = self._first_chunk_at - started if self._first_chunk_at is not None else None
+
+        self.timings.append({
+            "model": self.model,
+            "ttft": ttft,
+            "latency": latency,
+            "accepted": violation is None,
+        })
+        model_stats.record(self.model, latency, ttft=ttft, accepted=violation is None)
+
+
+    def _record_usage(self, usage):
+        """
+        Token counts reported by the backend at the end of a request, or
+        None if the request ended without them
+        """
+        for key in self.usage:
+            if usage is None or self.usage[key] is None:
+                self.usage[key] = None
+            else:
+                self.usage[key] += usage.get(key) or 0
+        model_stats.record_usage(self.model, usage)
+
+
+    def _request_usage(self):
+        """
+        An `on_usage` callback for one request, and a function to call once
+        it's over that records the usage as unknown if it never came
+        """
+        reported = []
+
+        def on_usage(usage):
+            reported.append(usage)
+            self._record_usage(usage)
+
+        def finish():
+            # usage comes in the stream's last chunk, so a request closed
+            # early by a stop, a validator or a selection never gets it
+            if not reported:
+                self._record_usage(None)
+
+        return on_usage, finish
+
+
+    async def _run_attempt(self):
+        """
+        Stream one generation, returns why it was abandoned if a validator failed
+        """
+        if self.n > 1:
+            return await self._run_samples()
+
+        on_usage, usage_done = self._request_usage()
+        gen = self._async_gen_func(
+            self.prompt, model=self.model, temperature=self.temperature,
+            on_usage=on_usage
+        )
+        try:
+            async for chunk in gen:
+                violation = self._feed(chunk)
+                if violation is not None or self.done() or self.status == CompletionStatus.FINISHED:
+                    return violation
+
+            return None
+
+        finally:
+            # stops the request as soon as we're done with it
+            await gen.aclose()
+            usage_done()
+
+
+    def _feed(self, chunk):
+        """
+        Add a streamed chunk, returns a validator violation if there is one
+        """
+        if self.done():
+            # cancelled, the task only notices at its next await
+            return None
+
+        if self._first_chunk_at is None:
+            self._first_chunk_at = time.monotonic()
+
+        with self._chunks_lock:
+            before = len(self.chunks)
+
+        # a stop keeps the text before it, and only that is validated
+        self._refresh_status(chunk)
+
+        with self._chunks_lock:
+            if self.status != CompletionStatus.FINISHED:
+                self.chunks.append(chunk)
+            new = "".join(self.chunks[before:])
+            if self.status == CompletionStatus.FINISHED:
+                # a stop can also trim text that was already streamed
+                self._length = sum(map(len, self.chunks))
+            else:
+                self._length += len(new)
+
+        if new:
+            self._notify_chunks()
+
+        return self._validate(new)
+
+
+    async def _run_samples(self):
+        """
+        Stream n samples from one request, each into its own Completion, until
+        the selection is decided. The winner's text becomes this completion's.
+        """
+        self.samples = [self._sample() for _ in range(self.n)]
+        finished = []
+        winner = None
+
+        on_usage, usage_done = self._request_usage()
+        gen = self._async_gen_func(
+            self.prompt, model=self.model, temperature=self.temperature, n=self.n,
+            on_usage=on_usage
+        )
+        try:
+            async for index, chunk in gen:
+                if self.done():
+                    break
+                if self._first_chunk_at is None:
+                    self._first_chunk_at = time.monotonic()
+
+                sample = self.samples[index]
+                if sample.done():
+                    continue
+
+                violation = sample._feed(chunk)
+                if violation is not None:
+                    sample.set_exception(ValidationError(f"Sample {violation}"))
+                    sample.status = CompletionStatus.ERROR
+                elif sample.status == CompletionStatus.FINISHED:
+                    sample.set_result(sample.result_so_far())
+                    finished.append(sample)
+                else:
+                    continue
+
+                winner = self._select_sample(finished)
+                if winner is not None:
+                    break
+
+            else:
+                for sample in self.samples:
+                    if not sample.done():
+                        sample.status = CompletionStatus.FINISHED
+                        sample.set_result(sample.result_so_far())
+                        finished.append(sample)
+
+                winner = self._select_sample(finished)
+
+        finally:
+            await gen.aclose()
+            usage_done()
+
+            # samples that can no longer win are cut
+            for sample in self.samples:
+                sample.cancel(CancelledError("Another sample was selected"))
+
+        if winner is None:
+            return "had no valid samples"
+
+        with self._chunks_lock:
+            self.chunks = list(winner.chunks)
+            self._length = winner._length
+        self._notify_chunks()
+        return None
+
+
+    def _sample(self):
+        sample = Completion(self.prompt, model=self.model, temperature=self.temperature)
+        sample.stops = self.stops
+        sample.validators = self.validators
+        sample.status = CompletionStatus.RUNNING
+        return sample
+
+
+    def _select_sample(self, finished):
+        """
+        The winning sample, or None if it isn't decided yet
+        """
+        if not finished:
+            return None
+
+        if self.select == "first":
+            return finished[0]
+
+        pending = sum(1 for sample in self.samples if not sample.done())
+
+        if self.select == "majority":
+            votes = {}
+            for sample in finished:
+                key = sample.result_so_far().strip()
+                votes[key] = votes.get(key, 0) + 1
+
+            # decided once the pending samples can't overturn the leader
+            ranked = sorted(votes.values(), reverse=True) + [0]
+            if pending and ranked[0] <= ranked[1] + pending:
+                return None
+
+            # ties go to the value that finished first
+            return max(finished, key=lambda s: votes[s.result_so_far().strip()])
+
+        if pending:
+            return None
+
+        if self.select == "longest":
+            return max(finished, key=lambda s: len(s.result_so_far()))
+
+        return max(finished, key=lambda s: self.select(s.result_so_far()))
+
+
+    def result_so_far(self):
+        with self._chunks_lock:
+            return "".join(self.chunks)
+
+
+    def _validate(self, new):
+        """
+        Run the validators after the text grew by `new`. `Validator`s check
+        the new text, other callables get the whole text, joined at most once.
+        """
+        if not self.validators:
+            return None
+
+        joined = []
+        def text():
+            if not joined:
+                with self._chunks_lock:
+                    joined.append("".join(self.chunks))
+            return joined[0]
+
+        for validator in self.validators:
+            if isinstance(validator, Validator):
+                violation = validator.check(new, self._length, text)
+            else:
+                violation = validator(text())
+            if violation is not None:
+                return violation
+
+        return None
+
+
     def _refresh_status(self, chunk):
         prompt = "".join(self.chunks)
         for stop in self.stops:
 
-            if stop.match(chunk):
-                match_idx = stop.match(chunk).start()
-                leading = len(chunk[:match_idx])
+            match = stop.search(chunk)
+            if match:
+                leading = match.start()
 
                 if leading > 0:
                     chunk = chunk[:leading]
@@ -190,11 +668,13 @@ class Completion:
     def set_result(self, result):
         self._result = result
         self._done_event.set()
+        self._notify_chunks()
         self._invoke_callbacks()
 
     def set_exception(self, exception):
         self._exception = exception
         self._done_event.set()
+        self._notify_chunks()
         self._invoke_callbacks()
 
     def result(self, timeout=None):
@@ -219,6 +699,53 @@ class Completion:
         return self._done_event.is_set()
 
 
+    # Streaming
+    def _notify_chunks(self):
+        with self._chunks_changed:
+            self._chunks_changed.notify_all()
+        for fn in list(self._chunk_listeners):
+            fn()
+
+
+    def stream(self, parser=None, resets=False):
+        """
+        Iterate over chunks as they arrive, with `for` or `async for`.
+
+        When a validator restarts the completion, the stream continues with
+        the new attempt's chunks, and what was streamed before is retracted.
+
+        :param parser: Optional incremental parser; its `feed(chunk)` and
+            `close()` return lists of events, which are yielded instead of
+            chunks. Its `reset()`, if it has one, is called on a restart.
+        :param resets: Yield `RESET` on a restart, before the new attempt's chunks
+        """
+        return ChunkStream(self, parser, resets)
+
+
+    def tags(self, *tags, whole=False, resets=False):
+        """
+        Stream `(tag, text)` events for XML-style tags in the completion,
+        see `lloam.tags.TagParser`. Recognises any tag if none are given.
+        """
+        return self.stream(TagParser(tags or None, whole=whole), resets)
+
+
+    def json(self, strict=False, stop_when_done=True):
+        """
+        Parse the completion as JSON while it streams, see `lloam.jsonstream.JSONStream`
+        """
+        return JSONStream(self, strict=strict, stop_when_done=stop_when_done)
+
+
+    def pipe(self, *transforms, executor=None):
+        """
+        Post-process the result in a worker process once it's done, returns
+        a Future. Takes a `lloam.pipeline.Pipeline` or picklable functions.
+        """
+        from .pipeline import pipe
+        return pipe(self, *transforms, executor=executor)
+
+
     def findall(self, pattern):
         self.result()
         return re.findall(pattern, "".join(self.chunks))
@@ -236,6 +763,105 @@ class Completion:
 
 
 
+class Reset:
+    def __repr__(self):
+        return "RESET"
+
+# yielded by `Completion.stream(resets=True)` when the completion restarts
+RESET = Reset()
+
+
+class ChunkStream:
+    """
+    Sync and async iteration over a Completion's chunks while it streams.
+    `attempt` is the attempt the chunks so far belong to.
+    """
+
+    def __init__(self, completion, parser=None, resets=False):
+        self.completion = completion
+        self.parser = parser
+        self.resets = resets
+        self.attempt = completion.attempts
+        self._restarted = False
+
+
+    def _take(self, i):
+        c = self.completion
+        if c.attempts != self.attempt:
+            # a validator restarted the completion, so follow the new attempt
+            self.attempt = c.attempts
+            self._restarted = True
+            i = 0
+        new = c.chunks[i:]
+        return new, i + len(new), c.done()
+
+
+    def _events(self, chunks, done):
+        if self._restarted:
+            self._restarted = False
+            if self.parser is not None and hasattr(self.parser, "reset"):
+                self.parser.reset()
+            if self.resets:
+                yield RESET
+
+        if self.parser is None:
+            yield from chunks
+            return
+
+        for chunk in chunks:
+            yield from self.parser.feed(chunk)
+        if done:
+            yield from self.parser.close()
+
+
+    def _finish(self):
+        if self.completion._exception:
+            raise self.completion._exception
+
+
+    def __iter__(self):
+        c = self.completion
+        i = 0
+        while True:
+            with c._chunks_changed:
+                while i >= len(c.chunks) and not c.done() and c.attempts == self.attempt:
+                    c._chunks_changed.wait()
+                new, i, done = self._take(i)
+
+            yield from self._events(new, done)
+            if done:
+                self._finish()
+                return
+
+
+    async def __aiter__(self):
+        c = self.completion
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(changed.set)
+
+        c._chunk_listeners.append(listener)
+        try:
+            i = 0
+            while True:
+                changed.clear()
+                with c._chunks_lock:
+                    new, i, done = self._take(i)
+
+                for event in self._events(new, done):
+                    yield event
+                if done:
+                    self._finish()
+                    return
+
+                await changed.wait()
+        finally:
+            c._chunk_listeners.remove(listener)
+
+
+
 if __name__ == "__main__":
 
 
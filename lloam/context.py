@@ -0,0 +1,229 @@
+import threading
+from functools import partial
+
+from .prompt import prompt
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token) that needs no tokenizer
+    """
+    return len(text) // 4 + 1
+
+
+@prompt
+def summarize(history):
+    """
+    Here is a log of earlier steps:
+    ```
+    {history}
+    ```
+
+    A concise summary of what happened, keeping any details needed to continue:
+    [summary]
+    """
+
+
+class Context:
+    """
+    A token-budgeted history that can be used directly as a {variable}
+    in lloam prompts.
+
+    Token counts are computed once per entry, so appending is O(1) plus
+    whatever is evicted. When the budget is exceeded the oldest entries
+    (after the first `keep_first`, before the last `keep_last`) are either
+    dropped (`policy="window"`) or folded into a summary that is generated
+    in the background (`policy="summarize"`). The context keeps one summary,
+    after the first `keep_first` entries, and each new summary folds in
+    the one before it. Newer entries are evicted to make room for it. If a
+    summary fails, the most recent lines of what it would have summarized
+    are kept in its place, as far as they fit, and the error is counted in
+    `summary_errors`.
+    """
+
+    def __init__(
+        self,
+        max_tokens=2000,
+        policy="window",
+        keep_first=0,
+        keep_last=1,
+        counter=approximate_tokens,
+        separator="\n"
+    ):
+        if policy not in ("window", "summarize"):
+            raise ValueError(f"Unknown context policy {policy}")
+
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.keep_first = keep_first
+        self.keep_last = keep_last
+        self.counter = counter
+        self.separator = separator
+
+        self._lock = threading.RLock()
+        self._entries = []  # {"text": str, "tokens": int, "summary": bool}
+        self._tokens = 0
+        self._separator_tokens = counter(separator) if separator else 0
+        self._rendered = None
+
+        self._summarizing = None  # the running summary prompt
+        self._backlog = []        # entries evicted while a summary is running
+        self.evicted = 0
+        self.summary_errors = 0
+        self.last_summary_error = None
+
+
+    def append(self, text):
+        text = str(text)
+        with self._lock:
+            self._insert(len(self._entries), text)
+            self._enforce()
+
+
+    def extend(self, texts):
+        for text in texts:
+            self.append(text)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._tokens = 0
+            self._backlog = []
+            self._rendered = None
+
+
+    @property
+    def tokens(self):
+        """
+        Token count of the rendered context
+        """
+        with self._lock:
+            return self._tokens
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __iter__(self):
+        with self._lock:
+            return iter([entry["text"] for entry in self._entries])
+
+
+    def __str__(self):
+        with self._lock:
+            if self._rendered is None:
+                self._rendered = self.separator.join(
+                    entry["text"] for entry in self._entries
+                )
+            return self._rendered
+
+
+    def __repr__(self):
+        return f"Context({len(self)} entries, {self.tokens}/{self.max_tokens} tokens)"
+
+
+    def _insert(self, index, text, summary=False):
+        tokens = self.counter(text) + self._separator_tokens
+
+        self._entries.insert(index, {"text": text, "tokens": tokens, "summary": summary})
+        self._tokens += tokens
+        self._rendered = None
+
+
+    def _pop(self, index, evicted=True):
+        entry = self._entries.pop(index)
+        self._tokens -= entry["tokens"]
+        self._rendered = None
+        self.evicted += evicted
+        return entry
+
+
+    def _oldest_evictable(self):
+        # summaries stay, they're replaced by the next summary instead
+        for index in range(self.keep_first, len(self._entries) - self.keep_last):
+            if not self._entries[index]["summary"]:
+                return index
+        return None
+
+
+    def _enforce(self):
+        evicted = []
+        while self._tokens > self.max_tokens:
+            index = self._oldest_evictable()
+            if index is None:
+                break
+            evicted.append(self._pop(index))
+
+        if not evicted or self.policy != "summarize":
+            return
+
+        self._backlog.extend(evicted)
+        if self._summarizing is None:
+            self._summarize()
+
+
+    def _summary(self):
+        for index, entry in enumerate(self._entries):
+            if entry["summary"]:
+                return index
+        return None
+
+
+    def _summarize(self):
+        # the current summary is folded into the next one, and replaced by it
+        index = self._summary()
+        previous = self._entries[index] if index is not None else None
+        texts = [previous["text"]] if previous is not None else []
+        history = "\n".join(texts + [entry["text"] for entry in self._backlog])
+        self._backlog = []
+
+        self._summarizing = summarize(history)
+        self._summarizing.prompt_vars["summary"].add_done_callback(
+            partial(self._on_summary, previous, history)
+        )
+
+
+    def _on_summary(self, previous, history, completion):
+        with self._lock:
+            self._summarizing = None
+
+            index = self._summary()
+            if index is not None and self._entries[index] is previous:
+                self._pop(index, evicted=False)
+
+            try:
+                summary = completion.result().strip()
+            except Exception as e:
+                self.summary_errors += 1
+                self.last_summary_error = e
+                summary = self._truncate(history, self.max_tokens - self._tokens)
+
+            if summary:
+                self._insert(min(self.keep_first, len(self._entries)), summary, summary=True)
+
+            # newer entries make room for the summary, and are summarized next
+            self._enforce()
+
+            index = self._summary()
+            if index is not None and self._tokens > self.max_tokens:
+                # nothing else can go, so the summary itself is cut down
+                entry = self._pop(index, evicted=False)
+                summary = self._truncate(entry["text"], self.max_tokens - self._tokens)
+                if summary:
+                    self._insert(index, summary, summary=True)
+
+
+    def _truncate(self, text, budget):
+        """
+        The last lines of `text` that fit in `budget` tokens
+        """
+        kept = []
+        tokens = self._separator_tokens
+        for line in reversed(text.split("\n")):
+            tokens += self.counter(line + "\n")
+            if tokens > budget:
+                break
+            kept.append(line)
+        return "\n".join(reversed(kept)).strip()
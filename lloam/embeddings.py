@@ -0,0 +1,158 @@
+import asyncio
+import base64
+import threading
+from concurrent.futures import Future
+
+from .completions import Completion
+
+
+DEFAULT_MODEL = "text-embedding-3-small"
+
+
+def numpy():
+    # numpy is only needed for embeddings, so lloam doesn't depend on it
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Embeddings need numpy, install it with `pip install lloam[embed]`") from None
+    return numpy
+
+
+async def openai_embeddings(texts, model=DEFAULT_MODEL, api_key=None, base_url=None, client=None):
+    """
+    Embed a list of texts in one request, returns a (len(texts), dim) float32 array
+    """
+    from .streaming import default_client
+
+    np = numpy()
+    if client is None:
+        client = default_client(api_key=api_key, base_url=base_url)
+
+    # base64 skips building a Python float for every dimension
+    response = await client.embeddings.create(input=texts, model=model, encoding_format="base64")
+
+    vectors = [None] * len(texts)
+    for item in response.data:
+        embedding = item.embedding
+        if isinstance(embedding, str):
+            embedding = np.frombuffer(base64.b64decode(embedding), dtype=np.float32)
+        vectors[item.index] = embedding
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class Embedder:
+    """
+    Collects concurrent embedding requests for a model and sends them in
+    batches from the completions loop. A batch goes out `max_delay`
+    seconds after its first request, or as soon as it has `max_batch`
+    texts, and larger batches are split into requests of `max_batch`.
+    """
+    backend = None
+
+    def __init__(self, model=DEFAULT_MODEL, max_batch=256, max_delay=0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._pending = []      # (texts, future, single)
+        self._queued = 0        # texts in _pending
+        self._scheduled = False
+
+        self.calls = 0          # embed() calls
+        self.inputs = 0         # texts embedded
+        self.requests = 0       # backend requests
+
+
+    def embed(self, texts) -> Future:
+        """
+        A Future for the vector of one text, or a (len(texts), dim) array of them
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        future = Future()
+        if not texts:
+            future.set_result(numpy().empty((0, 0), dtype="float32"))
+            return future
+
+        with self._lock:
+            self._pending.append((texts, future, single))
+            self._queued += len(texts)
+            self.calls += 1
+            schedule = not self._scheduled
+            self._scheduled = True
+            full = self._queued >= self.max_batch
+
+        loop = Completion.loop()
+        if full:
+            loop.call_soon_threadsafe(self._flush)
+        elif schedule:
+            loop.call_soon_threadsafe(loop.call_later, self.max_delay, self._flush)
+        return future
+
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._queued = 0
+            self._scheduled = False
+
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+
+    async def _send(self, batch):
+        texts = [text for texts, _, _ in batch for text in texts]
+        backend = self.backend or openai_embeddings
+
+        try:
+            np = numpy()
+            parts = range(0, len(texts), self.max_batch)
+            self.requests += len(parts)
+            self.inputs += len(texts)
+            results = await asyncio.gather(*(
+                backend(texts[i:i + self.max_batch], model=self.model) for i in parts
+            ))
+            vectors = np.concatenate([np.asarray(result, dtype=np.float32) for result in results])
+
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for texts, future, single in batch:
+            rows = vectors[start:start + len(texts)]
+            start += len(texts)
+            future.set_result(rows[0] if single else rows)
+
+
+def set_backend(backend=None):
+    """
+    Embed with `backend`, an async function (texts, model) -> array of
+    vectors (None restores the default, see `openai_embeddings`)
+    """
+    Embedder.backend = staticmethod(backend) if backend is not None else None
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+def embedder(model=DEFAULT_MODEL) -> Embedder:
+    """
+    The shared Embedder for a model
+    """
+    with _embedders_lock:
+        if model not in _embedders:
+            _embedders[model] = Embedder(model)
+        return _embedders[model]
+
+
+def embed(texts, model=DEFAULT_MODEL) -> Future:
+    """
+    Embed a text (or list of texts) in the background. Concurrent calls are
+    batched into as few requests as possible.
+
+    :return: A Future for the text's vector, or an array with a row per text
+    """
+    return embedder(model).embed(texts)
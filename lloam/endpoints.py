@@ -0,0 +1,250 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from .streaming import stream_chat_completion
+
+
+class NoEndpointAvailable(RuntimeError):
+    pass
+
+
+def retryable(error):
+    """
+    Whether an error says something about the endpoint (connection errors,
+    timeouts, 408, 429, 5xx) rather than the request. Client errors like a
+    400 for an oversized prompt would fail the same way on every endpoint.
+    """
+    from openai import APIStatusError
+
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 429)
+    return True
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible server, with passive health tracking:
+    moving averages of time to first token and error rate, and a circuit
+    breaker that opens after repeated failures.
+    """
+
+    def __init__(self, base_url=None, api_key=None, weight=1.0, models=None, name=None):
+        """
+        :param base_url: e.g. "http://localhost:8000/v1" (None for the provider default)
+        :param weight: Relative capacity, higher weight gets more traffic
+        :param models: The only models this endpoint serves if given, either a
+            list or a dict mapping lloam model names to the endpoint's names
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self.weight = weight
+        self.models = models
+        self.name = name or base_url or "default"
+
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ttft = None          # moving average, seconds
+        self.error_rate = 0.0     # moving average
+        self.consecutive_failures = 0
+        self.opened_at = None     # when the circuit opened
+        self._trial = False       # a half-open trial request is in flight
+
+        self._clients = {}
+
+
+    def serves(self, model):
+        return self.models is None or model in self.models
+
+
+    def model_name(self, model):
+        if isinstance(self.models, dict):
+            return self.models.get(model) or model
+        return model
+
+
+    def client(self):
+        # clients are tied to the event loop they're used on
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # the pool does its own failover, so the client shouldn't retry
+            client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0)
+            self._clients[loop] = client
+        return client
+
+
+    def __repr__(self):
+        return (
+            f"Endpoint({self.name!r}, outstanding={self.outstanding}, "
+            f"ttft={self.ttft}, error_rate={self.error_rate:.2f}, "
+            f"state={self.state()})"
+        )
+
+
+    def state(self, cooldown=None):
+        if self.opened_at is None:
+            return "closed"
+        if cooldown is not None and time.monotonic() - self.opened_at >= cooldown:
+            return "half-open"
+        return "open"
+
+
+class EndpointPool:
+    """
+    Spreads completions across several OpenAI-compatible endpoints.
+
+    Requests go to the healthy endpoint with the fewest outstanding requests
+    (`strategy="least_outstanding"`) or the lowest expected wait based on
+    time to first token (`strategy="latency"`), both relative to weight.
+    A request that fails before streaming anything is retried on another
+    endpoint, unless the endpoint rejected the request itself (see
+    `retryable`), in which case the error is raised right away. Endpoints that fail `failure_threshold` times in a row are
+    skipped for `cooldown` seconds, then get a single trial request.
+
+        pool = EndpointPool([Endpoint("http://a/v1"), Endpoint("http://b/v1")])
+        lloam.set_backend(pool.stream)
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        strategy="least_outstanding",
+        failure_threshold=3,
+        cooldown=30.0,
+        smoothing=0.2,
+        stream_fn=stream_chat_completion
+    ):
+        if strategy not in ("least_outstanding", "latency"):
+            raise ValueError(f"Unknown strategy {strategy}")
+
+        self.endpoints = [e if isinstance(e, Endpoint) else Endpoint(e) for e in endpoints]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.stream_fn = stream_fn
+
+
+    def select(self, model=None, exclude=()) -> Optional[Endpoint]:
+        candidates = []
+        for endpoint in self.endpoints:
+            if endpoint in exclude or not endpoint.serves(model):
+                continue
+
+            state = endpoint.state(self.cooldown)
+            if state == "open" or state == "half-open" and endpoint._trial:
+                continue
+            candidates.append(endpoint)
+
+        if not candidates:
+            return None
+
+        # endpoints without a measurement yet are assumed to be as fast as the best one
+        measured = [e.ttft for e in self.endpoints if e.ttft is not None]
+        default_ttft = min(measured) if measured else 1.0
+
+        def cost(endpoint):
+            load = (endpoint.outstanding + 1) / endpoint.weight
+            ttft = endpoint.ttft if endpoint.ttft is not None else default_ttft
+            if self.strategy == "latency":
+                return (load * ttft, endpoint.error_rate)
+            return (load, ttft, endpoint.error_rate)
+
+        return min(candidates, key=cost)
+
+
+    async def stream(self, messages, model="gpt-4o-mini", **kwargs):
+        """
+        Drop-in replacement for `stream_chat_completion` that routes the request
+        """
+        tried = set()
+        last_error = None
+
+        while True:
+            endpoint = self.select(model, exclude=tried)
+            if endpoint is None:
+                if last_error is not None:
+                    raise last_error
+                raise NoEndpointAvailable(f"No healthy endpoint serves {model}")
+
+            tried.add(endpoint)
+            streamed = False
+            self._begin(endpoint)
+            started = time.monotonic()
+
+            gen = self.stream_fn(
+                messages,
+                model=endpoint.model_name(model),
+                client=endpoint.client(),
+                **kwargs
+            )
+            try:
+                async for chunk in gen:
+                    if not streamed:
+                        streamed = True
+                        self._succeeded(endpoint, time.monotonic() - started)
+                    yield chunk
+
+                if not streamed:
+                    self._succeeded(endpoint, time.monotonic() - started)
+                return
+
+            except Exception as e:
+                if not retryable(e):
+                    # the request is at fault, not the endpoint
+                    raise
+                self._failed(endpoint)
+                if streamed:
+                    # some of the output already went to the caller
+                    raise
+                last_error = e
+
+            finally:
+                endpoint.outstanding -= 1
+                endpoint._trial = False
+                await gen.aclose()
+
+
+    def _begin(self, endpoint):
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        if endpoint.state(self.cooldown) == "half-open":
+            endpoint._trial = True
+
+
+    def _succeeded(self, endpoint, ttft):
+        a = self.smoothing
+        endpoint.ttft = ttft if endpoint.ttft is None else (1 - a) * endpoint.ttft + a * ttft
+        endpoint.error_rate = (1 - a) * endpoint.error_rate
+        endpoint.consecutive_failures = 0
+        endpoint.opened_at = None
+
+
+    def _failed(self, endpoint):
+        a = self.smoothing
+        endpoint.failures += 1
+        endpoint.error_rate = (1 - a) * endpoint.error_rate + a
+        endpoint.consecutive_failures += 1
+
+        if endpoint.consecutive_failures >= self.failure_threshold or endpoint.opened_at is not None:
+            # (re)open the circuit, a failed half-open trial waits another cooldown
+            endpoint.opened_at = time.monotonic()
+
+
+    def report(self):
+        return [
+            {
+                "name": e.name,
+                "state": e.state(self.cooldown),
+                "outstanding": e.outstanding,
+                "requests": e.requests,
+                "failures": e.failures,
+                "ttft": e.ttft,
+                "error_rate": e.error_rate,
+            }
+            for e in self.endpoints
+        ]
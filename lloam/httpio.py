@@ -0,0 +1,84 @@
+import json
+from urllib.parse import urlsplit, parse_qs
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+EVENT_STREAM = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+
+async def read_request(reader):
+    """
+    Read one HTTP/1.1 request, returns (method, path, query, headers, body).
+    Raises ConnectionError if the client closed the connection first, and
+    HTTPError(400) if the request is malformed.
+    """
+    try:
+        request_line = await reader.readline()
+        if not request_line.strip():
+            raise ConnectionError("Client closed the connection")
+
+        try:
+            method, target, _ = request_line.decode().split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+    except ValueError:
+        # undecodable bytes, or a line longer than the reader's limit
+        raise HTTPError(400, "Malformed request")
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Content-Length is not a number")
+    if length < 0:
+        raise HTTPError(400, "Content-Length is negative")
+
+    body = await reader.readexactly(length)
+    url = urlsplit(target)
+    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    return method, url.path, query, headers, body
+
+
+async def respond(writer, status, payload):
+    """
+    Write a complete JSON response
+    """
+    body = json.dumps(payload, default=str).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
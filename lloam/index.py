@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+
+from .embeddings import DEFAULT_MODEL, embed, numpy
+
+
+class Matches(list):
+    """
+    (item, score) pairs from a search, best first. As a prompt `{variable}`
+    it renders as the items, one per line.
+    """
+
+    @property
+    def items(self):
+        return [item for item, _ in self]
+
+    @property
+    def scores(self):
+        return [score for _, score in self]
+
+    def __str__(self):
+        return "\n".join(str(item) for item, _ in self)
+
+
+class VectorIndex:
+    """
+    Top-k cosine similarity search over vectors in one NumPy array, kept
+    in memory or memory-mapped from a file.
+
+        index = VectorIndex()
+        index.add(documents)                 # embeds them with lloam.embed
+        index.search("what is loam?", k=3)   # Matches [(document, score), ...]
+        docs = index.query(question)         # a Future, prompts wait for it
+
+    Rows are normalized when added, so a search is one matrix-vector
+    product and a partial sort. Capacity doubles as the index grows.
+
+    :param dim: Vector size, taken from the first vectors added if not given
+    :param path: Memory-map the vectors from this file. Items and the row
+        count are saved next to it in `path + ".json"` by `flush()`, and
+        loaded from there when the index is opened again.
+    :param model: The embedding model for texts
+    """
+
+    def __init__(self, dim=None, path=None, model=DEFAULT_MODEL, capacity=1024):
+        self.dim = dim
+        self.path = path
+        self.model = model
+        self.items = []
+        self.count = 0
+
+        self._capacity = capacity
+        self._vectors = None
+        self._lock = threading.RLock()
+
+        if path is not None and os.path.exists(path + ".json"):
+            self._load()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def add(self, items, vectors=None):
+        """
+        Add items (a text or list of them), embedding `str(item)` unless
+        `vectors` are given. Returns the new rows' ids.
+        """
+        np = numpy()
+        if isinstance(items, str):
+            items = [items]
+            if vectors is not None:
+                vectors = [vectors]
+        items = list(items)
+        if not items:
+            return []
+
+        if vectors is None:
+            vectors = embed([str(item) for item in items], model=self.model).result()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(items), -1)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of size {self.dim}, got {vectors.shape[1]}")
+
+            if self._vectors is None or self.count + len(items) > len(self._vectors):
+                self._reserve(self.count + len(items))
+
+            start = self.count
+            self._vectors[start:start + len(items)] = vectors
+            self.items.extend(items)
+            self.count += len(items)
+            return list(range(start, self.count))
+
+
+    def search(self, query, k=5) -> Matches:
+        """
+        The k items most similar to `query` (a text or a vector)
+        """
+        np = numpy()
+        if isinstance(query, str):
+            query = embed(query, model=self.model).result()
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            if not self.count:
+                return Matches()
+            scores = self._vectors[:self.count] @ query
+            items = self.items
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return Matches((items[i], float(scores[i])) for i in top)
+
+
+    def query(self, query, k=5) -> Future:
+        """
+        Like `search`, but returns a Future right away. Pass it to a prompt
+        as a `{variable}` and the prompt starts once the matches are in.
+        """
+        result = Future()
+
+        def done(vector):
+            try:
+                result.set_result(self.search(vector.result(), k))
+            except Exception as e:
+                result.set_exception(e)
+
+        if isinstance(query, str):
+            embed(query, model=self.model).add_done_callback(done)
+        else:
+            vector = Future()
+            vector.set_result(query)
+            done(vector)
+        return result
+
+
+    def flush(self):
+        """
+        Write a memory-mapped index's vectors and items to disk
+        """
+        if self.path is None:
+            return
+
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            with open(self.path + ".json", "w") as f:
+                json.dump({"dim": self.dim, "count": self.count, "model": self.model, "items": self.items}, f)
+
+
+    def _reserve(self, needed):
+        np = numpy()
+        capacity = max(self._capacity, needed)
+        if self._vectors is not None:
+            capacity = max(capacity, 2 * len(self._vectors))
+
+        if self.path is None:
+            vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            if self._vectors is not None:
+                vectors[:self.count] = self._vectors[:self.count]
+            self._vectors = vectors
+            return
+
+        # grow the file in place and map it again, the rows already written stay put
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._vectors = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+
+    def _load(self):
+        np = numpy()
+        with open(self.path + ".json") as f:
+            saved = json.load(f)
+
+        self.dim = saved["dim"]
+        self.count = saved["count"]
+        self.model = saved.get("model", self.model)
+        self.items = saved["items"]
+
+        if self.dim is not None:
+            capacity = os.path.getsize(self.path) // (self.dim * 4)
+            self._vectors = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
@@ -0,0 +1,422 @@
+import json
+import re
+import threading
+from concurrent.futures import Future
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+WHITESPACE = " \t\n\r"
+LITERALS = {"true": True, "false": False, "null": None}
+NUMBER_CHARS = set("0123456789+-.eE")
+STRING_SPECIAL = re.compile(r'["\\]')
+INCOMPLETE_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{0,3})?$')
+
+_MISSING = object()
+
+
+class JSONParser:
+    """
+    Incremental JSON parser for a stream of chunks.
+
+    Every chunk is scanned once; the only state kept is one small frame per
+    open container and the text of the scalar currently being read.
+    `feed()` returns `(path, value)` events for each value as soon as it
+    closes (containers included), and raises JSONStreamError at the first
+    character that can't be valid JSON.
+
+    Unless `strict`, text before the first `{`/`[` and after the end of
+    the document is ignored (e.g. prose or code fences around the JSON).
+    """
+
+    def __init__(self, strict=False):
+        self.strict = strict
+        self.root = _MISSING
+        self.done = False
+        self.position = 0    # characters consumed so far
+
+        self._stack = []     # one [container, key] frame per open container
+        self._state = "value" if strict else "start"
+        self._token = []     # pieces of the scalar being read
+        self._escaped = False
+        self._is_key = False
+
+
+    @property
+    def path(self):
+        return tuple(key for _, key in self._stack)
+
+
+    @property
+    def partial(self):
+        """
+        The document so far, including any string value that's still streaming
+        """
+        if self._state == "string" and not self._is_key and self._stack:
+            raw = INCOMPLETE_ESCAPE.sub("", "".join(self._token))
+            try:
+                self._set(json.loads(f'"{raw}"', strict=False))
+            except json.JSONDecodeError:
+                pass
+
+        return None if self.root is _MISSING else self.root
+
+
+    def feed(self, chunk):
+        events = []
+        i = 0
+        n = len(chunk)
+
+        while i < n:
+            state = self._state
+
+            if state == "string":
+                i = self._read_string(chunk, i, events)
+                continue
+
+            c = chunk[i]
+
+            if state == "number" or state == "literal":
+                if c in NUMBER_CHARS if state == "number" else c.isalpha():
+                    self._token.append(c)
+                    if state == "literal":
+                        self._check_literal(i)
+                    i += 1
+                    continue
+                self._finish_scalar(events, i)
+                continue  # the delimiter is handled in the new state
+
+            if c in WHITESPACE:
+                i += 1
+                continue
+
+            if state == "start":
+                if c in "{[":
+                    self._state = "value"
+                else:
+                    i += 1
+                continue
+
+            if state == "done":
+                if self.strict:
+                    self._error(c, "end of document", i)
+                break
+
+            if state == "value" or state == "value_or_close":
+                if c == "]" and state == "value_or_close":
+                    self._close(c, events, i)
+                else:
+                    self._start_value(c, i)
+
+            elif state == "key" or state == "key_or_close":
+                if c == '"':
+                    self._is_key = True
+                    self._state = "string"
+                elif c == "}" and state == "key_or_close":
+                    self._close(c, events, i)
+                else:
+                    self._error(c, "an object key", i)
+
+            elif state == "colon":
+                if c != ":":
+                    self._error(c, "':'", i)
+                self._state = "value"
+
+            elif state == "after":
+                frame = self._stack[-1]
+                if c == ",":
+                    if isinstance(frame[0], dict):
+                        self._state = "key"
+                    else:
+                        frame[1] += 1
+                        self._state = "value"
+                elif c in "}]":
+                    self._close(c, events, i)
+                else:
+                    self._error(c, "',' or a closing bracket", i)
+
+            i += 1
+
+        self.position += n
+        return events
+
+
+    def close(self):
+        """
+        Finish the document, raises JSONStreamError if it's incomplete
+        """
+        events = []
+        if self._state == "number" or self._state == "literal":
+            self._finish_scalar(events, 0)
+        if self._state != "done":
+            raise JSONStreamError("Incomplete JSON document")
+        return events
+
+
+    def _start_value(self, c, i):
+        if c == "{":
+            self._push({}, None)
+            self._state = "key_or_close"
+        elif c == "[":
+            self._push([], 0)
+            self._state = "value_or_close"
+        elif c == '"':
+            self._is_key = False
+            self._state = "string"
+        elif c == "-" or c.isdigit():
+            self._token = [c]
+            self._state = "number"
+        elif c in "tfn":
+            self._token = [c]
+            self._state = "literal"
+        else:
+            self._error(c, "a value", i)
+
+
+    def _push(self, container, key):
+        self._set(container)
+        self._stack.append([container, key])
+
+
+    def _set(self, value):
+        if not self._stack:
+            self.root = value
+            return
+
+        container, key = self._stack[-1]
+        if isinstance(container, list) and key == len(container):
+            container.append(value)
+        else:
+            container[key] = value
+
+
+    def _complete(self, path, value, events):
+        events.append((path, value))
+        if self._stack:
+            self._state = "after"
+        else:
+            self._state = "done"
+            self.done = True
+
+
+    def _close(self, bracket, events, i):
+        container, _ = self._stack[-1]
+        if (bracket == "}") != isinstance(container, dict):
+            self._error(bracket, "a matching bracket", i)
+
+        self._stack.pop()
+        self._complete(self.path, container, events)
+
+
+    def _read_string(self, chunk, i, events):
+        n = len(chunk)
+        if self._escaped:
+            self._token.append(chunk[i])
+            self._escaped = False
+            return i + 1
+
+        match = STRING_SPECIAL.search(chunk, i)
+        if match is None:
+            self._token.append(chunk[i:])
+            return n
+
+        j = match.start()
+        self._token.append(chunk[i:j])
+
+        if chunk[j] == "\\":
+            self._token.append("\\")
+            self._escaped = True
+            return j + 1
+
+        raw = "".join(self._token)
+        self._token = []
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except json.JSONDecodeError as e:
+            raise JSONStreamError(f"Invalid string at position {self.position + j}: {e.msg}") from None
+
+        if self._is_key:
+            self._stack[-1][1] = value
+            self._state = "colon"
+        else:
+            self._set(value)
+            self._complete(self.path, value, events)
+
+        return j + 1
+
+
+    def _check_literal(self, i):
+        token = "".join(self._token)
+        if not any(literal.startswith(token) for literal in LITERALS):
+            raise JSONStreamError(f"Invalid literal {token!r} at position {self.position + i}")
+
+
+    def _finish_scalar(self, events, i):
+        token = "".join(self._token)
+        self._token = []
+
+        if self._state == "literal":
+            if token not in LITERALS:
+                raise JSONStreamError(f"Invalid literal {token!r} at position {self.position + i}")
+            value = LITERALS[token]
+        else:
+            try:
+                value = json.loads(token)
+            except json.JSONDecodeError:
+                raise JSONStreamError(f"Invalid number {token!r} at position {self.position + i}") from None
+
+        self._set(value)
+        self._complete(self.path, value, events)
+
+
+    def _error(self, c, expected, i):
+        raise JSONStreamError(f"Expected {expected}, got {c!r} at position {self.position + i}")
+
+
+def field_path(field):
+    if isinstance(field, tuple):
+        return field
+    if isinstance(field, int):
+        return (field,)
+    return tuple(int(key) if key.isdigit() else key for key in field.split("."))
+
+
+class JSONStream:
+    """
+    Parses a Completion as JSON while it streams.
+
+    Handlers registered with `on_field` run as soon as that field's value
+    closes. If the output stops being valid JSON the completion is cancelled
+    right away, and once the document is complete generation is stopped.
+    """
+
+    def __init__(self, completion, strict=False, stop_when_done=True):
+        self.completion = completion
+        self.parser = JSONParser(strict=strict)
+        self.stop_when_done = stop_when_done
+        self.error = None
+
+        self._lock = threading.RLock()
+        self._consumed = 0
+        self._attempt = completion.attempts
+        self._values = {}    # path -> value, for fields that have closed
+        self._handlers = {}  # path -> [fn]
+        self._futures = {}   # path -> Future
+        self._finished = False
+
+        completion._chunk_listeners.append(self._update)
+        self._update()
+
+
+    @property
+    def partial(self):
+        with self._lock:
+            return self.parser.partial
+
+
+    def on_field(self, field, fn):
+        """
+        Call fn(value) once `field` (e.g. "color", "author.name", ("tags", 0)) closes
+        """
+        path = field_path(field)
+        with self._lock:
+            if path in self._values:
+                fn(self._values[path])
+            else:
+                self._handlers.setdefault(path, []).append(fn)
+        return self
+
+
+    def field(self, field) -> Future:
+        """
+        A future for the value of `field`
+        """
+        path = field_path(field)
+        with self._lock:
+            if path not in self._futures:
+                future = Future()
+                self._futures[path] = future
+                if path in self._values:
+                    future.set_result(self._values[path])
+                elif self._finished:
+                    future.set_exception(self.error or self._missing(path))
+            return self._futures[path]
+
+
+    def result(self, timeout=None):
+        self.completion._done_event.wait(timeout)
+        self._update()
+        with self._lock:
+            if self.error is not None:
+                raise self.error
+            if not self.parser.done:
+                raise JSONStreamError("Incomplete JSON document")
+            return self.parser.root
+
+
+    def _update(self):
+        with self._lock:
+            if self._finished:
+                return
+
+            c = self.completion
+            with c._chunks_lock:
+                if c.attempts != self._attempt:
+                    # a validator restarted the completion
+                    self._attempt = c.attempts
+                    self.parser = JSONParser(strict=self.parser.strict)
+                    self._consumed = 0
+                new = c.chunks[self._consumed:]
+                self._consumed += len(new)
+            done = c.done()
+
+            try:
+                for chunk in new:
+                    if self.parser.done:
+                        break
+                    self._dispatch(self.parser.feed(chunk))
+
+                if done and not self.parser.done and self.error is None and c._exception is None:
+                    self._dispatch(self.parser.close())
+
+            except Exception as e:
+                self.error = e
+                c.cancel(e)
+                self._finish()
+                return
+
+            if self.parser.done and self.stop_when_done:
+                c.cancel()
+
+            if done or self.parser.done:
+                self._finish()
+
+
+    def _dispatch(self, events):
+        for path, value in events:
+            self._values[path] = value
+
+            for fn in self._handlers.pop(path, []):
+                fn(value)
+
+            future = self._futures.get(path)
+            if future is not None and not future.done():
+                future.set_result(value)
+
+
+    def _finish(self):
+        self._finished = True
+        try:
+            self.completion._chunk_listeners.remove(self._update)
+        except ValueError:
+            pass
+
+        for path, future in self._futures.items():
+            if not future.done():
+                future.set_exception(self.error or self._missing(path))
+
+
+    def _missing(self, path):
+        return KeyError(f"JSON has no field {'.'.join(map(str, path))}")
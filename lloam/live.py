@@ -0,0 +1,199 @@
+import asyncio
+import shutil
+import sys
+import threading
+from concurrent.futures import Future
+
+from .completions import Completion, CompletionStatus, render_cell
+from .progress import redraw
+
+
+SYMBOLS = {
+    CompletionStatus.PENDING: "·",
+    CompletionStatus.RUNNING: "…",
+    CompletionStatus.FINISHED: "✓",
+    CompletionStatus.ERROR: "✗",
+}
+
+
+class LiveView:
+    """
+    Shows several Completions or Prompts streaming at once, one panel each
+    with the last `height` lines of its text.
+
+        await LiveView([answer, summary]).run()      # on your event loop
+
+        with LiveView(prompts):                      # or from a background thread
+            ...
+
+    Frames are drawn `fps` times a second at most, and only when something
+    streamed. Each frame reads the text the completions have collected so
+    far, taking only the chunks that are new since the last frame, and
+    rewrites only the lines that changed. Nothing waits on the terminal
+    while the streams are consumed.
+
+    :param items: A list of Completions/Prompts, or a dict of them by label
+    :param labels: Panel titles for a list of items
+    """
+
+    def __init__(self, items, labels=None, fps=10, height=4, width=None, stream=None, separator="─"):
+        if isinstance(items, dict):
+            labels, items = list(items.keys()), list(items.values())
+        self.items = list(items)
+        self.labels = [str(label) for label in labels] if labels else [f"#{i}" for i in range(len(self.items))]
+        self.interval = 1 / fps
+        self.height = height
+        self.width = width
+        self.stream = stream or sys.stdout
+        self.separator = separator
+
+        self.frames = 0
+        self._frame = []
+        self._texts = {}
+        self._versions = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+
+    # drivers
+    async def run(self):
+        """
+        Render until every item is done
+        """
+        while not self.tick():
+            await asyncio.sleep(self.interval)
+
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def _run(self):
+        while not self.tick() and not self._stop_event.wait(self.interval):
+            pass
+        self.tick()
+
+
+    def tick(self):
+        """
+        Draw a frame if anything changed, returns True once every item is done
+        """
+        completions = [self._completions(item) for item in self.items]
+        # checked first, so the last frame shows the final text
+        done = all(c.done() for group in completions for c in group)
+        versions = [
+            [(c.status, c.attempts, len(c.chunks)) for c in group]
+            for group in completions
+        ]
+
+        if versions != self._versions:
+            self._versions = versions
+            self._frame = redraw(self.stream, self._frame, self.render())
+            self.frames += 1
+
+        return done
+
+
+    # rendering
+    def render(self):
+        width = self.width or shutil.get_terminal_size().columns
+        lines = []
+        for label, item in zip(self.labels, self.items):
+            status = self._status(item)
+            lines.append(f"{SYMBOLS[status]} {label}"[:width])
+            lines.extend(self._tail(self._text(item), width))
+            lines.append(self.separator * width)
+        return lines
+
+
+    def _tail(self, text, width):
+        """
+        The last `height` rows of the text wrapped to `width`, padded to `height`
+        """
+        rows = []
+        # only the end of the text is split, however long it gets
+        for line in text.rsplit("\n", self.height)[-self.height:]:
+            line = line.expandtabs()
+            rows.extend([line[i:i + width] for i in range(0, len(line), width)] or [""])
+        rows = rows[-self.height:]
+        return [""] * (self.height - len(rows)) + rows
+
+
+    def _text(self, item):
+        if isinstance(item, Completion):
+            return self._completion_text(item)
+
+        parts = []
+        for cell in item.cells:
+            if isinstance(cell, Completion):
+                if cell.status == CompletionStatus.PENDING:
+                    parts.append("[     ]")
+                elif cell.status == CompletionStatus.ERROR:
+                    parts.append("[error]")
+                else:
+                    parts.append(self._completion_text(cell))
+            elif isinstance(cell, Future) and not cell.done():
+                parts.append("[ ... ]")
+            else:
+                try:
+                    parts.append(render_cell(cell))
+                except Exception:
+                    parts.append("[error]")
+        return "".join(parts)
+
+
+    def _completion_text(self, completion):
+        """
+        The completion's text so far, joining only the chunks that are new since the last frame
+        """
+        attempt, seen, text = self._texts.get(completion, (None, 0, ""))
+        if completion.done():
+            # stop matching can trim the last chunk, so the final text is read once in full
+            if seen != -1:
+                text = completion.result_so_far()
+                self._texts[completion] = (completion.attempts, -1, text)
+            return text
+
+        with completion._chunks_lock:
+            if completion.attempts != attempt:
+                seen, text = 0, ""
+            attempt = completion.attempts
+            new = completion.chunks[seen:]
+
+        text += "".join(new)
+        self._texts[completion] = (attempt, seen + len(new), text)
+        return text
+
+
+    def _completions(self, item):
+        if isinstance(item, Completion):
+            return [item]
+        return item.completions()
+
+
+    def _status(self, item):
+        statuses = [c.status for c in self._completions(item)]
+        if CompletionStatus.ERROR in statuses:
+            return CompletionStatus.ERROR
+        if all(status == CompletionStatus.FINISHED for status in statuses):
+            return CompletionStatus.FINISHED
+        if all(status == CompletionStatus.PENDING for status in statuses):
+            return CompletionStatus.PENDING
+        return CompletionStatus.RUNNING
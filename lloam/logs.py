@@ -0,0 +1,206 @@
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from functools import partial
+
+
+LEVELS = {
+    "debug": 10,
+    "info": 20,
+    "warning": 30,
+    "error": 40,
+}
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+def _close_at_exit(ref):
+    logger = ref()
+    if logger is not None:
+        logger.close()
+
+
+class Logger:
+    """
+    Bounded, non-blocking structured log.
+
+    `log()` only filters by level and enqueues a record; a background
+    writer thread does all formatting and I/O, writing batches of JSONL
+    records to `sink` and echoing `[level] message` lines to stdout.
+    Whatever is still queued is written when the interpreter exits.
+    A batch that fails to write is counted in `errors` and skipped, the
+    writer keeps going.
+    """
+
+    def __init__(
+        self,
+        level="info",
+        capacity=1000,
+        sink=None,
+        echo=True,
+        max_pending=10000,
+        batch_size=256,
+        flush_interval=0.5
+    ):
+        """
+        :param level: Minimum level that is recorded (other level names
+            passed to `log()` are treated as "info")
+        :param capacity: Number of records kept in memory (oldest are evicted)
+        :param sink: A path or writable stream to append JSONL records to
+        :param echo: Print records to stdout
+        :param max_pending: Records waiting for the writer before new ones are dropped
+        """
+        self.level = LEVELS[level]
+        self.records = deque(maxlen=capacity)
+        self.sink = sink
+        self.echo = echo
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.dropped = 0     # records not written because the writer fell behind
+        self.overflowed = 0  # records evicted from the in-memory buffer
+        self.errors = 0      # failed writes, the last is `last_error`
+        self.last_error = None
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # holds the logger weakly, so registering it doesn't keep it alive
+        self._at_exit = partial(_close_at_exit, weakref.ref(self))
+
+
+    def log(self, message, level="info", **fields):
+        if LEVELS.get(level, LEVELS["info"]) < self.level:
+            return
+
+        record = {
+            "level": level,
+            "message": message,
+            "timestamp": time.time(),
+            **fields
+        }
+
+        if len(self.records) == self.records.maxlen:
+            self.overflowed += 1
+        self.records.append(record)
+
+        if not self.echo and self.sink is None:
+            return
+
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+
+        if self._thread is None:
+            self._start()
+        self._queue.put(record)
+
+
+    def flush(self, timeout=None):
+        """
+        Block until everything logged so far has been written
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+
+    def close(self):
+        """
+        Write everything logged so far and stop the writer thread
+        (logging again starts a new one)
+        """
+        if self._thread is None:
+            return
+        atexit.unregister(self._at_exit)
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._thread = None
+
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self._at_exit)
+
+
+    def _run(self):
+        stream = self.sink
+        owns_stream = isinstance(stream, str)
+        if owns_stream:
+            try:
+                stream = open(stream, "a")
+            except OSError as e:
+                # keep echoing, records just don't reach the sink
+                self._failed(e)
+                stream = None
+                owns_stream = False
+
+        try:
+            closing = False
+            while not closing:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                batch = []
+                flushes = []
+                while True:
+                    if item is _CLOSE:
+                        closing = True
+                    elif isinstance(item, tuple) and item[0] is _FLUSH:
+                        flushes.append(item[1])
+                    else:
+                        batch.append(item)
+
+                    if closing or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._write(batch, stream)
+                except Exception as e:
+                    self._failed(e)
+                finally:
+                    for done in flushes:
+                        done.set()
+
+        finally:
+            if owns_stream:
+                stream.close()
+
+
+    def _failed(self, error):
+        self.errors += 1
+        self.last_error = error
+
+
+    def _write(self, batch, stream):
+        if not batch:
+            return
+
+        if stream is not None:
+            lines = [json.dumps(record, default=str) + "\n" for record in batch]
+            stream.write("".join(lines))
+            stream.flush()
+
+        if self.echo:
+            lines = [f"[{record['level']}] {record['message']}\n" for record in batch]
+            sys.stdout.write("".join(lines))
+            sys.stdout.flush()
@@ -0,0 +1,150 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+
+from .tools import is_future, submit_when_ready, when_all
+
+
+_process_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool(max_workers=None) -> ProcessPoolExecutor:
+    """
+    The process pool pipelines share by default, created on first use
+    (`max_workers` only applies then)
+    """
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_context())
+    return _process_pool
+
+
+def _context():
+    # forking while the completions loop thread is running can deadlock the child
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def apply(transforms, value):
+    for transform in transforms:
+        value = transform(value)
+    return value
+
+
+def text_of(item):
+    """
+    The text a pipeline gets for an item: a Completion's result, a Prompt
+    rendered once every hole and future in it is done, or the item itself
+    """
+    from .prompt import Prompt
+
+    if not isinstance(item, Prompt):
+        return item
+
+    text = Future()
+
+    def render():
+        try:
+            text.set_result(str(item))
+        except Exception as e:
+            text.set_exception(e)
+
+    when_all([cell for cell in item.cells if is_future(cell)], render)
+    return text
+
+
+class Pipeline:
+    """
+    Post-processing (parsing, extraction, scoring...) of completion results
+    in worker processes, so it doesn't compete with stream handling for the GIL.
+
+        extract = Pipeline(json.loads, score)
+        future = extract.submit(completion)        # or completion.pipe(extract)
+        for score in extract.map(prompts, ordered=False):
+            ...
+
+    Each item's text is sent to a worker once as a plain string, the
+    transforms run one after the other there, and only the final result
+    comes back. Transforms must be picklable, i.e. module-level functions
+    or `functools.partial`s of them (e.g. `partial(re.findall, pattern)`).
+
+    :param executor: Where the transforms run, by default a shared process pool
+    :param max_workers: Give the pipeline its own process pool of this size
+    """
+
+    def __init__(self, *transforms, executor=None, max_workers=None):
+        self.transforms = transforms
+        self.max_workers = max_workers
+        self._executor = executor
+        self._lock = threading.Lock()
+
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.max_workers is None:
+                return process_pool()
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_context())
+        return self._executor
+
+
+    def then(self, *transforms) -> "Pipeline":
+        """
+        A pipeline with more transforms at the end, on the same executor
+        """
+        pipeline = Pipeline(*self.transforms, *transforms, max_workers=self.max_workers)
+        pipeline._executor = self._executor
+        return pipeline
+
+
+    def submit(self, item) -> Future:
+        """
+        Process a Completion, Prompt, Future or string once it's done,
+        returns a Future for the result
+        """
+        return submit_when_ready(self.executor, apply, self.transforms, text_of(item))
+
+
+    def submit_all(self, items):
+        return [self.submit(item) for item in items]
+
+
+    def map(self, items, ordered=True, timeout=None):
+        """
+        Process all the items, yielding results in the items' order, or as
+        soon as each is ready with `ordered=False`
+        """
+        # like Executor.map, everything is submitted before the first result is asked for
+        futures = self.submit_all(items)
+
+        def results():
+            if ordered:
+                for future in futures:
+                    yield future.result(timeout)
+            else:
+                for future in as_completed(futures, timeout):
+                    yield future.result()
+
+        return results()
+
+
+    def __call__(self, item) -> Future:
+        return self.submit(item)
+
+
+    def __repr__(self):
+        names = [getattr(t, "__name__", repr(t)) for t in self.transforms]
+        return f"Pipeline({' -> '.join(names)})"
+
+
+def pipe(item, *transforms, executor=None):
+    """
+    Run a Pipeline, or transforms, on an item, see `Completion.pipe`
+    """
+    if len(transforms) == 1 and isinstance(transforms[0], Pipeline):
+        return transforms[0].submit(item)
+    return Pipeline(*transforms, executor=executor).submit(item)
@@ -0,0 +1,207 @@
+import sys
+import threading
+import time
+
+from .completions import CompletionStatus
+
+
+DONE = "■"
+WAITING = "□"
+
+
+class ProgressRegistry:
+    """
+    Aggregated status counts for the completions an agent runs.
+    Completions publish their status transitions here, so keeping
+    the view current costs O(1) per transition regardless of agent size.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._counts = {}  # label -> {status: count}
+        self.version = 0
+
+
+    def track(self, completion, label="completion"):
+        """
+        Start following a completion's status transitions under `label`.
+        """
+        counted = []  # the status this completion is counted under
+
+        def on_transition(completion, old, new):
+            self._transition(counts, counted, new)
+
+        with self._lock:
+            counts = self._counts.setdefault(
+                label, {status: 0 for status in CompletionStatus}
+            )
+            # subscribed first, so no transition is missed; one that lands
+            # before the status is read waits for the lock and finds it counted
+            completion.subscribe(on_transition)
+            status = completion.status
+            counts[status] += 1
+            counted.append(status)
+            self.version += 1
+            self._changed.notify_all()
+
+
+    def track_prompt(self, prompt, label):
+        for completion in prompt.completions():
+            self.track(completion, label)
+
+
+    def _transition(self, counts, counted, new):
+        with self._lock:
+            if counted[0] == new:
+                return
+            counts[counted[0]] -= 1
+            counts[new] += 1
+            counted[0] = new
+            self.version += 1
+            self._changed.notify_all()
+
+
+    def wait_for_change(self, version, timeout=None):
+        """
+        Block until the registry moves past `version` (or timeout).
+        Returns the current version.
+        """
+        with self._lock:
+            if self.version == version:
+                self._changed.wait(timeout)
+            return self.version
+
+
+    def snapshot(self):
+        with self._lock:
+            return self.version, {
+                label: dict(counts) for label, counts in self._counts.items()
+            }
+
+
+    def totals(self):
+        _, snapshot = self.snapshot()
+        totals = {status: 0 for status in CompletionStatus}
+        for counts in snapshot.values():
+            for status, n in counts.items():
+                totals[status] += n
+        return totals
+
+
+    def format(self, width=20):
+        _, snapshot = self.snapshot()
+        return format_counts(snapshot, width=width)
+
+
+def format_counts(snapshot, width=20):
+    lines = []
+    label_width = max((len(label) for label in snapshot), default=0)
+
+    for label, counts in snapshot.items():
+        finished = counts[CompletionStatus.FINISHED]
+        errors = counts[CompletionStatus.ERROR]
+        total = sum(counts.values())
+        if total == 0:
+            continue
+
+        n_done = round(width * (finished + errors) / total)
+        bar = DONE * n_done + WAITING * (width - n_done)
+
+        line = f"{label:<{label_width}} {bar} {finished}/{total}"
+        if counts[CompletionStatus.RUNNING]:
+            line += f" ({counts[CompletionStatus.RUNNING]} running)"
+        if errors:
+            line += f" ({errors} failed)"
+
+        lines.append(line)
+
+    return lines
+
+
+class ProgressRenderer:
+    """
+    Draws a registry to a terminal from a background thread.
+    Only redraws when the registry changed, at most `fps` times a second,
+    and only rewrites the lines that differ from the previous frame.
+    """
+
+    def __init__(self, registry, stream=None, fps=10, width=20, footer=None):
+        self.registry = registry
+        self.stream = stream or sys.stdout
+        self.interval = 1 / fps
+        self.width = width
+        self.footer = list(footer or [])
+
+        self._frame = []
+        self._stop_event = threading.Event()
+        self._thread = None
+
+
+    def start(self):
+        if self._thread is not None:
+            return self
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+    def _run(self):
+        version = -1
+        last_draw = 0.0
+        try:
+            while not self._stop_event.is_set():
+                version = self.registry.wait_for_change(version, timeout=self.interval)
+
+                wait = self.interval - (time.monotonic() - last_draw)
+                if wait > 0 and self._stop_event.wait(wait):
+                    break
+
+                version, snapshot = self.registry.snapshot()
+                self.draw(format_counts(snapshot, width=self.width) + self.footer)
+                last_draw = time.monotonic()
+
+            self.draw(self.registry.format(width=self.width) + self.footer)
+
+        except Exception as e:
+            print(f"An error occurred in the observation thread: {e}")
+
+
+    def draw(self, lines):
+        self._frame = redraw(self.stream, self._frame, lines)
+
+
+def redraw(stream, previous, lines):
+    """
+    Rewrite the lines of the previous frame that changed, in place.
+    Returns the new frame.
+    """
+    if lines == previous:
+        return previous
+
+    out = []
+    if previous:
+        out.append(f"\033[{len(previous)}F")  # back to the first line
+
+    for i, line in enumerate(lines):
+        if i < len(previous) and previous[i] == line:
+            out.append("\033[1E")
+        else:
+            out.append(f"\033[2K{line}\n")
+
+    for _ in range(len(previous) - len(lines)):
+        out.append("\033[2K\n")
+    if len(previous) > len(lines):
+        out.append(f"\033[{len(previous) - len(lines)}F")
+
+    stream.write("".join(out))
+    stream.flush()
+    return list(lines)
@@ -1,3 +1,4 @@
+import functools
 import textwrap
 import inspect
 import re
@@ -5,24 +6,24 @@ from enum import Enum
 from concurrent.futures import Future
 import asyncio
 
-from .completions import Completion, CompletionStatus
+from .completions import Completion, CompletionStatus, Role, render_cell
+from .tools import when_all
+from .validators import Validator
 
 
 def prompt(f=None, *, model="gpt-4o-mini", temperature=0.9):
 
     if f is None:
         def decorator(f):
+            @functools.wraps(f)
             def wrapper(*args, **kwargs):
                 fn_args, default_kwargs = get_signature(f)
 
                 kwargs = {**default_kwargs, **kwargs}
 
-                if len(args) < len(fn_args):
-                    for arg in fn_args:
-                        if arg not in kwargs:
-                            raise ValueError(f"Missing postitional argument {arg}")
-
-                    raise ValueError(f"Expected {len(fn_args)} arguments, got {len(args)}")
+                for arg in fn_args[len(args):]:
+                    if arg not in kwargs:
+                        raise ValueError(f"Missing positional argument {arg}")
 
                 args = {k: v for k, v in zip(fn_args, args)}
                 args = {**args, **kwargs}
@@ -33,17 +34,15 @@ def prompt(f=None, *, model="gpt-4o-mini", temperature=0.9):
 
         return decorator
 
+    @functools.wraps(f)
     def wrapper(*args, **kwargs):
         fn_args, default_kwargs = get_signature(f)
 
         kwargs = {**default_kwargs, **kwargs}
 
-        if len(args) < len(fn_args):
-            for arg in fn_args:
-                if arg not in kwargs:
-                    raise ValueError(f"Missing postitional argument {arg}")
-
-            raise ValueError(f"Expected {len(fn_args)} arguments, got {len(args)}")
+        for arg in fn_args[len(args):]:
+            if arg not in kwargs:
+                raise ValueError(f"Missing positional argument {arg}")
 
         args = {k: v for k, v in zip(fn_args, args)}
         args = {**args, **kwargs}
@@ -131,7 +130,48 @@ def parse_prompt(text):
     return result
 
 
+HOLE_PATTERN = re.compile(r'\s*(\w+)\s*(?:\((.*?)\))?\s*(?::(.*))?', re.DOTALL)
+
+def parse_hole(symbol):
+    """
+    Parse a hole like `name`, `name:stop` or `name(key=value ...):stop`
+    into its name, stop regex and options
+    """
+    match = HOLE_PATTERN.fullmatch(symbol)
+    if match is None:
+        raise ValueError(f"Invalid hole [{symbol}]")
+
+    name, options, stop = match.groups()
+    if stop is not None:
+        stop = stop.strip()
+
+    parsed = {}
+    for option in (options or "").split():
+        key, _, value = option.partition("=")
+        parsed[key] = value
+
+    return name, stop or None, parsed
+
+
+ROLE_PATTERN = re.compile(r'<\|(system|user|assistant)\|>')
+
+def split_roles(text):
+    """
+    Split body text around `<|system|>`, `<|user|>` and `<|assistant|>`
+    markers into text and Role cells
+    """
+    cells = []
+    for i, part in enumerate(ROLE_PATTERN.split(text)):
+        if i % 2:
+            cells.append(Role(part))
+        elif part:
+            cells.append(part)
+    return cells
+
+
 def compile_prompt(prompt_src: str, args, model="gpt-4o-mini", temperature=0.9):
+    from .context import Context
+
     prompt_vars = {**args}
     cells = []
     entrypoint = None
@@ -141,12 +181,14 @@ def compile_prompt(prompt_src: str, args, model="gpt-4o-mini", temperature=0.9):
     for segment_type, symbol in parse_prompt(prompt_src):
 
         if segment_type == PromptSegment.BODY:
-            cells.append(symbol)
+            cells.extend(split_roles(symbol))
 
         elif segment_type == PromptSegment.VARIABLE:
             if symbol in prompt_vars:
                 if isinstance(prompt_vars[symbol], Prompt):
                     cells.append(prompt_vars[symbol].result())
+                elif isinstance(prompt_vars[symbol], Context):
+                    cells.append(str(prompt_vars[symbol]))
                 else:
                     cells.append(prompt_vars[symbol])
 
@@ -158,6 +200,10 @@ def compile_prompt(prompt_src: str, args, model="gpt-4o-mini", temperature=0.9):
                 for attribute in attributes:
                     nested_result = getattr(nested_result, attribute)
 
+                if isinstance(nested_result, Context):
+                    # contexts keep changing, the prompt sees them as they are now
+                    nested_result = str(nested_result)
+
                 cells.append(nested_result)
 
             else:
@@ -167,14 +213,26 @@ def compile_prompt(prompt_src: str, args, model="gpt-4o-mini", temperature=0.9):
             if symbol in prompt_vars:
                 raise ValueError(f"Variable {symbol} already defined")
 
-            stop = None
-            if ":" in symbol:
-                symbol, regexp = symbol.split(":")
-                symbol = symbol.strip()
-                stop = regexp.strip()
+            symbol, stop, options = parse_hole(symbol)
+
+            validator = None
+            if {"prefix", "chars", "max"} & options.keys():
+                validator = Validator(
+                    prefix=options.get("prefix"),
+                    chars=options.get("chars"),
+                    max_length=int(options["max"]) if "max" in options else None
+                )
+
+            hole_model = model
+            if "model" in options:
+                # e.g. model=gpt-4o-mini>gpt-4o escalates through a cascade
+                hole_model = options["model"].split(">")
+                hole_model = hole_model if len(hole_model) > 1 else hole_model[0]
 
             completion = Completion(
-                cells, stop=stop, model=model, temperature=temperature
+                cells, stop=stop, model=hole_model, temperature=temperature,
+                validate=validator, retries=int(options.get("retries", 0)),
+                n=int(options.get("n", 1)), select=options.get("select", "majority")
             )
 
             cells.append(completion)
@@ -182,7 +240,8 @@ def compile_prompt(prompt_src: str, args, model="gpt-4o-mini", temperature=0.9):
 
             if prev_call:
                 # TODO: us Prompt/Completion/Agent start() method
-                prompt_vars[prev_call].add_done_callback(lambda fut, content=symbol: prompt_vars[content].start())
+                futures = [cell for cell in cells if isinstance(cell, Future)]
+                when_all([prompt_vars[prev_call], *futures], completion.start)
             else:
                 entrypoint = symbol
 
@@ -200,7 +259,16 @@ class Prompt:
         self.prompt_src = preprocess(f)
         self.cells, self.prompt_vars, entrypoint = compile_prompt(self.prompt_src, args, model=model, temperature=temperature)
 
-        self.prompt_vars[entrypoint].start()
+        # prompts defined on agents report to the agent's progress registry
+        from .agent import Agent
+        owner = args.get("self")
+        if isinstance(owner, Agent):
+            owner.progress.track_prompt(self, f.__name__)
+
+        # holes start once the futures (e.g. tool results) before them are done
+        entry = self.prompt_vars[entrypoint]
+        futures = [cell for cell in self.cells[:self.cells.index(entry)] if isinstance(cell, Future)]
+        when_all(futures, entry.start)
 
     def __getattr__(self, name):
         if name in self.prompt_vars:
@@ -209,7 +277,13 @@ class Prompt:
             raise AttributeError(f"Prompt has no attribute {name}")
 
     def __str__(self):
-        return "".join(str(cell) for cell in self.cells)
+        return "".join(render_cell(cell) for cell in self.cells)
+
+    def future(self, name):
+        """
+        The Completion for a hole, without waiting for it to finish
+        """
+        return self.prompt_vars[name]
 
     def __await__(self):
         return self._check_completion().__await__()
@@ -227,16 +301,47 @@ class Prompt:
         for cell in self.cells:
             if isinstance(cell, Completion):
                 chunks.append(cell.visual_status())
+            elif isinstance(cell, Future) and not cell.done():
+                chunks.append("[ ... ]")
             else:
-                chunks.append(str(cell))
+                chunks.append(render_cell(cell))
 
         return "".join(chunks)
 
 
 
+    def completions(self):
+        return [var for var in self.prompt_vars.values() if isinstance(var, Completion)]
+
+
+    def pipe(self, *transforms, executor=None):
+        """
+        Post-process the rendered prompt in a worker process once every
+        hole is done, returns a Future. See `Completion.pipe`.
+        """
+        from .pipeline import pipe
+        return pipe(self, *transforms, executor=executor)
+
+
+    def usage(self):
+        """
+        Token counts summed over the prompt's holes, including cached prompt
+        tokens. Counts are None if a hole's request ended before its usage
+        was reported (see `Completion.usage`).
+        """
+        usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        for completion in self.completions():
+            for key in usage:
+                if usage[key] is None or completion.usage[key] is None:
+                    usage[key] = None
+                else:
+                    usage[key] += completion.usage[key]
+        return usage
+
+
     def progress(self):
-        n_completions = sum(1 for var in self.prompt_vars.values() if isinstance(var, Completion))
-        n_completed = sum(1 for var in self.prompt_vars.values() if isinstance(var, Completion) and var.status == CompletionStatus.FINISHED)
+        n_completions = sum(1 for var in self.completions())
+        n_completed = sum(1 for var in self.completions() if var.status == CompletionStatus.FINISHED)
 
         n_waiting = n_completions - n_completed
 
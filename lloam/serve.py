@@ -0,0 +1,289 @@
+import asyncio
+import inspect
+import json
+import threading
+from concurrent.futures import CancelledError
+
+from .completions import RESET, Completion
+from .httpio import EVENT_STREAM, HTTPError, read_request, respond, sse
+
+
+class PromptServer:
+    """
+    Serves `@lloam.prompt` functions over HTTP.
+
+    `POST /<name>` with the prompt's arguments as a JSON object streams
+    Server-Sent Events as the holes fill in:
+
+        event: hole    data: {"hole": "answer"}
+        event: token   data: {"hole": "answer", "text": "Par"}
+        event: reset   data: {"hole": "answer"}   (a validator restarted the hole)
+        event: done    data: {"hole": "answer", "text": "Paris"}
+        event: error   data: {"hole": "answer", "error": "..."}
+        event: end     data: {"holes": {"answer": "Paris"}}
+
+    With `?stream=false` it waits and replies with the `end` object as JSON.
+    `GET /` lists the prompts and their arguments.
+
+    If the client disconnects, the prompt's completions are cancelled.
+    At most `max_concurrent` prompts run at once, up to `max_pending` more
+    requests wait for a slot, and the rest are turned away with a 429.
+    Malformed requests get a 400, and any other error a 500 (or an `error`
+    event, once the stream has started).
+
+    :param prompts: {name: prompt function}, or a list of prompt functions
+    """
+
+    def __init__(self, prompts, host="127.0.0.1", port=8000, max_concurrent=16, max_pending=64):
+        if not isinstance(prompts, dict):
+            prompts = {fn.__name__: fn for fn in prompts}
+
+        self.prompts = prompts
+        self.host = host
+        self.port = port
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+
+        self.active = 0
+        self.pending = 0
+        self.served = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+        self._slots = None
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+
+    async def serve(self):
+        """
+        Serve on the running event loop until cancelled
+        """
+        await self.listen()
+        async with self._server:
+            await self._server.serve_forever()
+
+
+    async def listen(self):
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+
+    def run(self):
+        """
+        Serve until interrupted
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+
+    # in a background thread, e.g. for tests and notebooks
+    def start(self):
+        self._thread = threading.Thread(target=self._run_in_thread, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def _run_in_thread(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self.listen())
+        self._ready.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.close()
+
+
+    def describe(self):
+        prompts = {}
+        for name, fn in self.prompts.items():
+            params = inspect.signature(fn).parameters.values()
+            prompts[name] = {
+                "args": [p.name for p in params if p.default is inspect.Parameter.empty],
+                "kwargs": {p.name: p.default for p in params if p.default is not inspect.Parameter.empty},
+                "doc": inspect.getdoc(fn),
+            }
+        return prompts
+
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                method, path, query, headers, body = await read_request(reader)
+
+                if path in ("", "/"):
+                    if method != "GET":
+                        raise HTTPError(405, f"{method} not allowed on /")
+                    await respond(writer, 200, {"prompts": self.describe()})
+                    return
+
+                fn = self.prompts.get(path.strip("/"))
+                if fn is None:
+                    raise HTTPError(404, f"No prompt at {path}")
+                if method != "POST":
+                    raise HTTPError(405, "Use POST to run a prompt")
+
+                try:
+                    args = json.loads(body) if body else {}
+                except json.JSONDecodeError as e:
+                    raise HTTPError(400, f"Body is not JSON: {e}")
+                if not isinstance(args, dict):
+                    raise HTTPError(400, "Body must be a JSON object of arguments")
+
+                stream = query.get("stream", "true").lower() not in ("0", "false", "no")
+                await self._admit(fn, args, stream, reader, writer)
+
+            except HTTPError as e:
+                await respond(writer, e.status, {"error": str(e)})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                await respond(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _admit(self, fn, args, stream, reader, writer):
+        if self._slots.locked() and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPError(429, "Too many requests, try again later")
+
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+
+        self.active += 1
+        try:
+            await self._run(fn, args, stream, reader, writer)
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+
+    async def _run(self, fn, args, stream, reader, writer):
+        try:
+            # compiling can block, e.g. on `{variables}` that are other prompts
+            prompt = await asyncio.to_thread(fn, **args)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+
+        holes = [(name, var) for name, var in prompt.prompt_vars.items() if isinstance(var, Completion)]
+
+        def cancel(_=None):
+            for _, completion in holes:
+                completion.cancel(CancelledError("Request cancelled"))
+
+        # the client sends nothing more, so reading only returns once it disconnects
+        disconnected = asyncio.ensure_future(reader.read())
+        disconnected.add_done_callback(cancel)
+        finished = False
+
+        try:
+            if stream:
+                writer.write(EVENT_STREAM)
+                await writer.drain()
+
+            results = {}
+            for name, completion in holes:
+                error = await (self._stream_hole(name, completion, writer) if stream else self._wait_hole(completion))
+                if disconnected.done():
+                    raise ConnectionError("Client disconnected")
+                if error is not None:
+                    if not stream:
+                        raise HTTPError(500, f"Hole {name} failed: {error}")
+                    break
+                results[name] = completion.result()
+
+            if stream:
+                writer.write(sse("end", {"holes": results}))
+                await writer.drain()
+            else:
+                await respond(writer, 200, {"holes": results})
+            finished = True
+            self.served += 1
+
+        except (ConnectionError, HTTPError):
+            raise
+        except Exception as e:
+            if not stream:
+                raise
+            # the status line is already sent, so the error goes in the stream
+            writer.write(sse("error", {"error": f"{type(e).__name__}: {e}"}))
+            await writer.drain()
+
+        finally:
+            disconnected.remove_done_callback(cancel)
+            disconnected.cancel()
+            if not finished:
+                self.cancelled += 1
+                cancel()
+
+
+    async def _stream_hole(self, name, completion, writer):
+        """
+        Forward a hole's chunks as they arrive, returns the error if it failed
+        """
+        writer.write(sse("hole", {"hole": name}))
+        try:
+            async for chunk in completion.stream(resets=True):
+                if chunk is RESET:
+                    writer.write(sse("reset", {"hole": name}))
+                else:
+                    writer.write(sse("token", {"hole": name, "text": chunk}))
+                await writer.drain()
+
+        except ConnectionError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            writer.write(sse("error", {"hole": name, "error": error}))
+            await writer.drain()
+            return error
+
+        writer.write(sse("done", {"hole": name, "text": completion.result()}))
+        await writer.drain()
+        return None
+
+
+    async def _wait_hole(self, completion):
+        try:
+            async for _ in completion.stream():
+                pass
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        return None
+
@@ -0,0 +1,158 @@
+import operator
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+from .completions import Completion
+from .tools import when_all
+
+
+class SpeculationStats:
+    """
+    How often speculative steps were committed, and the time they saved
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def record(self, outcome, seconds=0.0):
+        """
+        :param outcome: "hit" (committed), "miss" (cancelled) or "skipped" (no prediction)
+        :param seconds: For a hit, the head start it got; for a miss, the time spent on it
+        """
+        with self._lock:
+            self.counts[outcome] += 1
+            if outcome == "hit":
+                self.saved += seconds
+            elif outcome == "miss":
+                self.wasted += seconds
+
+
+    def report(self):
+        """
+        {"speculated", "hits", "misses", "skipped", "hit_rate", "saved_seconds", "wasted_seconds"}
+        """
+        with self._lock:
+            hits, misses = self.counts["hit"], self.counts["miss"]
+            speculated = hits + misses
+            return {
+                "speculated": speculated,
+                "hits": hits,
+                "misses": misses,
+                "skipped": self.counts["skipped"],
+                "hit_rate": hits / speculated if speculated else None,
+                "saved_seconds": self.saved,
+                "wasted_seconds": self.wasted,
+            }
+
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"hit": 0, "miss": 0, "skipped": 0}
+            self.saved = 0.0
+            self.wasted = 0.0
+
+
+def step_completions(step):
+    if isinstance(step, Completion):
+        return [step]
+    if hasattr(step, "completions"):
+        return step.completions()
+    return []
+
+
+def cancel_step(step):
+    for completion in step_completions(step):
+        completion.cancel(CancelledError("Speculation missed"))
+
+
+def speculate(observation, next_step, predict=None, equivalent=None, stats=None, executor=None) -> Future:
+    """
+    Start the step after `observation` before it arrives, assuming it
+    will be `predict`.
+
+    Once the observation is done, the speculative step is kept if
+    `equivalent(predicted, actual)` (equality by default), otherwise it's
+    cancelled and `next_step(actual)` is started instead.
+
+    :param observation: A Future or Completion, e.g. a tool result
+    :param next_step: fn(observation) -> Prompt (or Completion) for the next step
+    :param predict: The expected observation, or a function returning it.
+        None (or a function returning None) doesn't speculate.
+    :param executor: Where `next_step(actual)` runs. Without one it runs in
+        the observation's done callback, which for a Completion is on the
+        completions loop, so it mustn't block.
+    :return: A Future for the next step's Prompt, done once the observation is
+    """
+    equivalent = equivalent or operator.eq
+    result = Future()
+
+    def start(actual):
+        try:
+            result.set_result(next_step(actual))
+        except Exception as e:
+            result.set_exception(e)
+
+    def run_next_step(actual):
+        if executor is None:
+            start(actual)
+        else:
+            executor.submit(start, actual)
+
+    if callable(predict):
+        predict = predict()
+
+    if predict is None:
+        if stats is not None:
+            stats.record("skipped")
+
+        def run(observation):
+            try:
+                actual = observation.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            run_next_step(actual)
+
+        observation.add_done_callback(run)
+        return result
+
+    started = time.monotonic()
+    speculative = next_step(predict)
+    finished = []
+    when_all(step_completions(speculative), lambda: finished.append(time.monotonic()))
+
+    def on_observation(observation):
+        observed_at = time.monotonic()
+        # how long the speculative step ran before the observation could have started it
+        head_start = min([observed_at, *finished]) - started
+
+        try:
+            actual = observation.result()
+        except Exception as e:
+            cancel_step(speculative)
+            if stats is not None:
+                stats.record("miss", head_start)
+            result.set_exception(e)
+            return
+
+        try:
+            hit = equivalent(predict, actual)
+        except Exception:
+            hit = False
+
+        if hit:
+            if stats is not None:
+                stats.record("hit", head_start)
+            result.set_result(speculative)
+            return
+
+        cancel_step(speculative)
+        if stats is not None:
+            stats.record("miss", head_start)
+        run_next_step(actual)
+
+    observation.add_done_callback(on_observation)
+    return result
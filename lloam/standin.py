@@ -0,0 +1,286 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+import struct
+import threading
+import time
+
+from .httpio import EVENT_STREAM, HTTPError, read_request, respond
+
+
+def echo(messages, model):
+    """
+    Default reply: repeat the last message back
+    """
+    if not messages:
+        return ""
+    return f"You said: {messages[-1]['content']}"
+
+
+def tokenize(text):
+    """
+    Split text into word-ish pieces that look like a token stream
+    """
+    tokens = []
+    start = 0
+    for i in range(1, len(text)):
+        if text[i] == " " and text[i - 1] != " ":
+            tokens.append(text[start:i])
+            start = i
+    tokens.append(text[start:])
+    return [token for token in tokens if token]
+
+
+def embedding(text, dim=64):
+    """
+    A deterministic stand-in embedding: words hashed into signed buckets,
+    so texts that share words have a higher cosine similarity
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vector[bucket] += 1.0 if digest[4] % 2 else -1.0
+
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class StandinServer:
+    """
+    Serves /v1/chat/completions (streaming and not) and /v1/embeddings
+    (see `embedding`) from a background thread.
+
+        with StandinServer(reply="Paris.") as server:
+            lloam.set_backend(...)  # or AsyncOpenAI(base_url=server.url)
+
+    :param reply: A string, or a function (messages, model) -> str
+    :param ttft: Seconds before the first token
+    :param token_delay: Seconds between tokens
+    :param fail: Respond to every request with a 500 error
+    :param prefill: Extra seconds before the first token per uncached prompt token
+    :param dim: Size of the embeddings
+    :param context_window: Reject chat requests with more prompt tokens than
+        this with a 400, like a provider's context length error
+
+    Like provider prompt caches, prompt tokens are "cached" in blocks of
+    `cache_block` when the request's messages start with the same bytes
+    as one of the last `cache_size` requests, and reported as
+    `usage.prompt_tokens_details.cached_tokens`. A token is 4 characters
+    of the messages' JSON.
+    """
+
+    def __init__(
+        self, reply=echo, ttft=0.0, token_delay=0.0, fail=False, prefill=0.0,
+        cache_block=64, cache_size=32, dim=64, context_window=None, host="127.0.0.1", port=0
+    ):
+        self.reply = reply if callable(reply) else (lambda messages, model: reply)
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.fail = fail
+        self.prefill = prefill
+        self.cache_block = cache_block
+        self.cache_size = cache_size
+        self.dim = dim
+        self.context_window = context_window
+        self.host = host
+        self.port = port
+
+        self.requests = 0
+        self.active = 0
+        self.embedding_inputs = 0
+        self._prefixes = []
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.close()
+
+
+    async def _handle(self, reader, writer):
+        self.requests += 1
+        self.active += 1
+        try:
+            try:
+                method, path, _, _, body = await read_request(reader)
+                try:
+                    request = json.loads(body) if body else {}
+                except json.JSONDecodeError as e:
+                    raise HTTPError(400, f"Body is not JSON: {e}")
+
+                if self.fail:
+                    raise HTTPError(500, "stand-in failure")
+                elif method == "POST" and path.endswith("/chat/completions"):
+                    await self._chat(request, writer)
+                elif method == "POST" and path.endswith("/embeddings"):
+                    await self._embeddings(request, writer)
+                else:
+                    raise HTTPError(404, f"no route {path}")
+
+            except HTTPError as e:
+                await respond(writer, e.status, {"error": {"message": str(e)}})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                await respond(writer, 500, {"error": {"message": f"{type(e).__name__}: {e}"}})
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+
+
+    def _usage(self, messages, replies):
+        prompt = json.dumps(messages)
+        shared = max((len(os.path.commonprefix([prompt, previous])) for previous in self._prefixes), default=0)
+
+        self._prefixes.append(prompt)
+        del self._prefixes[:-self.cache_size]
+
+        prompt_tokens = len(prompt) // 4
+        cached_tokens = shared // 4 // self.cache_block * self.cache_block
+        completion_tokens = sum(len(tokenize(reply)) for reply in replies)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+
+    async def _chat(self, request, writer):
+        model = request.get("model", "stand-in")
+        messages = request.get("messages", [])
+        n = request.get("n") or 1
+
+        prompt_tokens = len(json.dumps(messages)) // 4
+        if self.context_window is not None and prompt_tokens > self.context_window:
+            await respond(writer, 400, {"error": {
+                "message": f"{prompt_tokens} prompt tokens exceed the context window of {self.context_window}",
+                "code": "context_length_exceeded",
+            }})
+            return
+
+        replies = [self.reply(messages, model) for _ in range(n)]
+        usage = self._usage(messages, replies)
+
+        delay = self.ttft + self.prefill * (usage["prompt_tokens"] - usage["prompt_tokens_details"]["cached_tokens"])
+        if delay:
+            await asyncio.sleep(delay)
+
+        if not request.get("stream"):
+            await respond(writer, 200, {
+                "id": "standin",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": i, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                    for i, reply in enumerate(replies)
+                ],
+                "usage": usage,
+            })
+            return
+
+        writer.write(EVENT_STREAM)
+
+        def event(choices, usage=None):
+            chunk = {
+                "id": "standin",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+            }
+            if usage is not None:
+                chunk["usage"] = usage
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        streams = [tokenize(reply) for reply in replies]
+        for step in range(max(len(tokens) for tokens in streams)):
+            for i, tokens in enumerate(streams):
+                if step < len(tokens):
+                    writer.write(event([{"index": i, "delta": {"content": tokens[step]}, "finish_reason": None}]))
+            await writer.drain()
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+
+        writer.write(event([{"index": i, "delta": {}, "finish_reason": "stop"} for i in range(n)]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            writer.write(event([], usage))
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+
+    async def _embeddings(self, request, writer):
+        texts = request.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        self.embedding_inputs += len(texts)
+
+        if self.ttft:
+            await asyncio.sleep(self.ttft)
+
+        data = []
+        for i, text in enumerate(texts):
+            vector = embedding(text, self.dim)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{self.dim}f", *vector)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+
+        tokens = sum(len(tokenize(text)) for text in texts)
+        await respond(writer, 200, {
+            "object": "list",
+            "model": request.get("model", "stand-in"),
+            "data": data,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
@@ -0,0 +1,90 @@
+import threading
+
+
+class ModelStats:
+    """
+    Per-model request counts and latencies, aggregated across completions.
+    Used to tune model cascades: how often each model's output is accepted,
+    and what it costs in time to first token and total latency. Also counts
+    the prompt tokens that providers served from their prompt cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+
+
+    def _stats(self, model):
+        return self._models.setdefault(model, {
+            "requests": 0,
+            "accepted": 0,
+            "latency": 0.0,
+            "ttft": 0.0,
+            "ttft_samples": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+            "usage_unreported": 0,
+        })
+
+
+    def record(self, model, latency, ttft=None, accepted=True):
+        with self._lock:
+            stats = self._stats(model)
+            stats["requests"] += 1
+            stats["accepted"] += accepted
+            stats["latency"] += latency
+            if ttft is not None:
+                stats["ttft"] += ttft
+                stats["ttft_samples"] += 1
+
+
+    def record_usage(self, model, usage):
+        """
+        :param usage: {"prompt_tokens", "cached_tokens", "completion_tokens"} for one
+            request, or None if it ended before the provider reported usage
+        """
+        with self._lock:
+            stats = self._stats(model)
+            if usage is None:
+                # left out of the token counts rather than counted as zero
+                stats["usage_unreported"] += 1
+                return
+            for key in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+                stats[key] += usage.get(key) or 0
+
+
+    def report(self):
+        """
+        {model: {"requests", "accepted", "escalated", "mean_latency", "mean_ttft",
+                 "prompt_tokens", "cached_tokens", "cache_hit_rate", "usage_unreported"}}
+
+        Token counts and the cache hit rate only cover requests that reported
+        usage, `usage_unreported` counts the ones that didn't.
+        """
+        with self._lock:
+            report = {}
+            for model, stats in self._models.items():
+                requests = stats["requests"]
+                report[model] = {
+                    "requests": requests,
+                    "accepted": stats["accepted"],
+                    "escalated": requests - stats["accepted"],
+                    "mean_latency": stats["latency"] / requests if requests else None,
+                    "mean_ttft": stats["ttft"] / stats["ttft_samples"] if stats["ttft_samples"] else None,
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "cached_tokens": stats["cached_tokens"],
+                    "cache_hit_rate": (
+                        stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else None
+                    ),
+                    "usage_unreported": stats["usage_unreported"],
+                }
+            return report
+
+
+    def reset(self):
+        with self._lock:
+            self._models = {}
+
+
+model_stats = ModelStats()
@@ -1,7 +1,28 @@
 import asyncio
-from openai import AsyncOpenAI
-from typing import List, Dict, AsyncGenerator, Optional
-import re
+from typing import TYPE_CHECKING, Callable, List, Dict, AsyncGenerator, Optional
+
+from .tags import TagParser
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+# openai (and httpx, pydantic...) take a while to import, so clients are
+# created on the first request and reused, one per event loop
+_clients = {}
+
+def default_client(api_key=None, base_url=None):
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _clients if key[0].is_closed()]:
+        del _clients[key]
+
+    key = (loop, api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    return client
 
 
 async def stream_chat_completion(
@@ -9,136 +30,95 @@ async def stream_chat_completion(
     model: str = "gpt-4o-mini",
     temperature: float = 0.9,
     stop: Optional[List[str]] = None,
-    api_key: Optional[str] = None
+    api_key: Optional[str] = None,
+    n: int = 1,
+    base_url: Optional[str] = None,
+    client: Optional["AsyncOpenAI"] = None,
+    on_usage: Optional[Callable[[Dict[str, int]], None]] = None
 ) -> AsyncGenerator[str, None]:
-    client = AsyncOpenAI(api_key=api_key)
+    """
+    Yields content deltas, or (choice index, delta) pairs if n > 1
+
+    Without a `client`, a shared one for `base_url`/`api_key` is used.
+
+    If `on_usage` is given, it's called with the request's
+    {"prompt_tokens", "cached_tokens", "completion_tokens"} once the stream ends.
+    Providers send usage in the last chunk, so it isn't called if the stream
+    is closed before then.
+    """
+    if client is None:
+        client = default_client(api_key=api_key, base_url=base_url)
 
     if isinstance(messages, str):
         messages = [{"role": "assistant", "content": messages}]
+    options = {}
+    if on_usage is not None:
+        options["stream_options"] = {"include_usage": True}
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stop=stop,
+        n=n,
+        stream=True,
+        **options
+    )
     try:
-        stream = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            stop=stop,
-            stream=True
-        )
-        try:
-            async for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
-        finally:
-            await stream.close()
+        async for chunk in stream:
+            if on_usage is not None and getattr(chunk, "usage", None):
+                on_usage(usage_counts(chunk.usage))
+
+            if n > 1:
+                for choice in chunk.choices:
+                    if choice.delta.content is not None:
+                        yield choice.index, choice.delta.content
+            elif chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
     finally:
-        await client.close()
-        del client
+        await stream.close()
 
 
-async def parallel_stream_processing(questions: list[str]):
-    
-    responses = [[] for _ in questions]
-    
-    async def process_stream(question, index):
-        async for chunk in stream_chat_completion([{"role": "user", "content": question}]):
-            responses[index].append(chunk)
-            # Clear the console and print the current state of all streams
-            print("\033[H\033[J", end="")  # Clear console
+def usage_counts(usage):
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+    }
 
-            for i, r in enumerate(responses):
-                print(f"{''.join(r)}")
-                print(80*'-')
-            
-            # Add a small delay to make the output more readable
-            await asyncio.sleep(0.1)
 
-    # Create tasks for each question
-    tasks = [process_stream(q, i) for i, q in enumerate(questions)]
-    
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+async def parallel_stream_processing(questions: list[str], fps: int = 10):
+    """
+    Answer the questions concurrently, showing the answers live as they stream.
+    Returns the chunks of each answer.
+    """
+    from .completions import Completion
+    from .live import LiveView
 
-    return responses
+    completions = []
+    for question in questions:
+        completion = Completion([{"role": "user", "content": question}])
+        completion.start()
+        completions.append(completion)
 
+    await LiveView(completions, labels=questions, fps=fps).run()
 
-async def process_stream(generator, tags):
-    buffer = ''
-    captured_content = ''
-    current_tag = None  # Holds the current tag name when inside a tag
-    opening_tags = {tag: f'<{tag}>' for tag in tags}
-    closing_tags = {tag: f'</{tag}>' for tag in tags}
+    return [completion.chunks for completion in completions]
 
-    max_open_tag_length = max(len(tag_str) for tag_str in opening_tags.values())
-    max_close_tag_length = max(len(tag_str) for tag_str in closing_tags.values())
 
-    # Compile regex patterns for opening and closing tags
-    opening_pattern = '(' + '|'.join(re.escape(tag) for tag in opening_tags.values()) + ')'
-    opening_regex = re.compile(opening_pattern)
-    closing_regexes = {tag: re.compile(re.escape(closing_tags[tag])) for tag in tags}
+async def process_stream(generator, tags):
+    """
+    Yield (tag, content) for each of `tags` in an async stream of chunks,
+    and (None, text) for text outside of them.
+    """
+    parser = TagParser(tags, whole=True)
 
     async for chunk in generator:
-        buffer += chunk
-        while True:
-            if current_tag is None:
-                # Search for any opening tag
-                open_match = opening_regex.search(buffer)
-
-                if open_match:
-                    # If there is content before the opening tag, capture and yield it
-                    leading_content = buffer[:open_match.start()]
-                    if leading_content:
-                        yield (None, leading_content)
-
-                    tag_text = open_match.group(0)
-                    # Identify which tag was found
-                    for tag_name, tag_str in opening_tags.items():
-                        if tag_str == tag_text:
-                            current_tag = tag_name
-                            break
-                    buffer = buffer[open_match.end():]  # Remove processed part
-                else:
-                    # No opening tag found in buffer
-                    # Need to check if we can safely yield part of the buffer
-                    if len(buffer) > max_open_tag_length:
-                        # Safe to yield buffer up to the point where an opening tag may start
-                        safe_to_yield = buffer[:-max_open_tag_length]
-                        buffer = buffer[-max_open_tag_length:]
-                        if safe_to_yield:
-                            yield (None, safe_to_yield)
-                    else:
-                        # Not enough data to decide, need to read more
-                        break
-            else:
-                # Search for the corresponding closing tag
-                close_match = closing_regexes[current_tag].search(buffer)
-                if close_match:
-                    # Capture content up to the closing tag
-                    content = buffer[:close_match.start()]
-                    captured_content += content
-                    # Handle the captured content (e.g., print or store it)
-                    yield (current_tag, captured_content)
-                    captured_content = ''
-                    current_tag = None
-                    buffer = buffer[close_match.end():]
-                else:
-                    # No closing tag found in buffer
-                    # Need to check if we can safely capture part of the buffer
-                    if len(buffer) > max_close_tag_length:
-                        # Safe to capture content up to the point where a closing tag may start
-                        safe_to_capture = buffer[:-max_close_tag_length]
-                        captured_content += safe_to_capture
-                        buffer = buffer[-max_close_tag_length:]
-                    else:
-                        # Not enough data to decide, need to read more
-                        break
-
-    # After processing all chunks
-    if current_tag is None:
-        if buffer:
-            yield (None, buffer)
-    else:
-        # Handle any remaining content if the closing tag was not found
-        captured_content += buffer
-        yield (current_tag, captured_content)
+        for event in parser.feed(chunk):
+            yield event
+
+    for event in parser.close():
+        yield event
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+import re
+
+
+TAG = re.compile(r'<(/)?([A-Za-z_][\w.:-]*)((?:\s[^<>]*?)?)\s*(/)?>')
+ATTRIBUTE = re.compile(r'''([^\s=/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"']+)))?''')
+
+
+class Tag(str):
+    """
+    The name of an open tag. Compares equal to its name, and also
+    carries its attributes and the tag it is nested in.
+    Each occurrence of a tag is a distinct object.
+    """
+
+    def __new__(cls, name, attrs=None, parent=None):
+        tag = super().__new__(cls, name)
+        tag.attrs = attrs or {}
+        tag.parent = parent
+        return tag
+
+    @property
+    def path(self):
+        path = []
+        tag = self
+        while tag is not None:
+            path.append(str(tag))
+            tag = tag.parent
+        return tuple(reversed(path))
+
+    def __repr__(self):
+        return f"Tag({str(self)!r}, {self.attrs})"
+
+
+def parse_attributes(src):
+    attrs = {}
+    for match in ATTRIBUTE.finditer(src):
+        name, double, single, bare = match.groups()
+        value = double if double is not None else single if single is not None else bare
+        attrs[name] = value if value is not None else True
+    return attrs
+
+
+class TagParser:
+    """
+    Incremental tokenizer for XML-ish tags in a token stream.
+
+    `feed()` returns the `(tag, text)` events that are unambiguous so far,
+    where `tag` is the innermost open Tag (or None outside of tags).
+    Only a possible partial tag at the end of a chunk is held back, so the
+    total work is linear in the length of the stream.
+
+    With `whole=True`, text inside tags is instead reported once per tag
+    when it closes, with all of its (nested) contents.
+    """
+
+    def __init__(self, tags=None, whole=False, max_tag_length=256):
+        """
+        :param tags: Tag names to recognise (all well-formed tags if None)
+        :param whole: Report complete tag contents when each tag closes
+        :param max_tag_length: Longest `<...>` that is treated as a tag
+        """
+        self.tags = set(tags) if tags is not None else None
+        self.whole = whole
+        self.max_tag_length = max_tag_length
+        self.reset()
+
+
+    def reset(self):
+        """
+        Forget everything fed so far, e.g. when the stream restarts
+        """
+        self.stack = []
+        self._pending = []   # pieces of a possible tag, starting with "<"
+        self._pending_length = 0
+
+        # text inside tags when whole=True, each open tag remembers where it started
+        self._captured = []
+        self._starts = []
+
+        self._run = None
+
+
+    @property
+    def current(self):
+        return self.stack[-1] if self.stack else None
+
+
+    def feed(self, chunk):
+        events = []
+
+        if self._pending:
+            close = chunk.find(">")
+            reopen = chunk.find("<")
+
+            if reopen != -1 and (close == -1 or reopen < close):
+                # another "<" before any ">", the pending text isn't a tag
+                self._text("".join(self._pending) + chunk[:reopen], events)
+                self._clear_pending()
+                chunk = chunk[reopen:]
+
+            elif close == -1:
+                self._pending.append(chunk)
+                self._pending_length += len(chunk)
+                if self._pending_length > self.max_tag_length:
+                    self._text("".join(self._pending), events)
+                    self._clear_pending()
+                self._flush_run(events)
+                return events
+
+            else:
+                candidate = "".join(self._pending) + chunk[:close + 1]
+                self._clear_pending()
+                self._tag_or_text(candidate, events)
+                chunk = chunk[close + 1:]
+
+        self._scan(chunk, events)
+        self._flush_run(events)
+        return events
+
+
+    def close(self):
+        """
+        Flush anything held back at the end of the stream
+        """
+        events = []
+        if self._pending:
+            self._text("".join(self._pending), events)
+            self._clear_pending()
+
+        if self.whole:
+            # unclosed tags report whatever they captured
+            while self.stack:
+                tag = self.stack.pop()
+                start = self._starts.pop()
+                events.append((tag, "".join(self._captured[start:])))
+            self._captured = []
+        else:
+            self.stack = []
+
+        self._flush_run(events)
+        return events
+
+
+    def _scan(self, chunk, events):
+        pos = 0
+        close = None
+        while pos < len(chunk):
+            open_ = chunk.find("<", pos)
+            if open_ == -1:
+                self._text(chunk[pos:], events)
+                return
+
+            if open_ > pos:
+                self._text(chunk[pos:open_], events)
+
+            # reuse the last ">" found, so runs of "<" don't rescan the chunk
+            if close is None or close != -1 and close < open_:
+                close = chunk.find(">", open_ + 1)
+            reopen = chunk.find("<", open_ + 1, close if close != -1 else len(chunk))
+
+            if reopen != -1:
+                self._text(chunk[open_:reopen], events)
+                pos = reopen
+                continue
+
+            if close == -1:
+                rest = chunk[open_:]
+                if len(rest) > self.max_tag_length:
+                    self._text(rest, events)
+                else:
+                    self._pending.append(rest)
+                    self._pending_length = len(rest)
+                return
+
+            self._tag_or_text(chunk[open_:close + 1], events)
+            pos = close + 1
+
+
+    def _clear_pending(self):
+        self._pending = []
+        self._pending_length = 0
+
+
+    def _tag_or_text(self, candidate, events):
+        match = None
+        if len(candidate) <= self.max_tag_length:
+            match = TAG.fullmatch(candidate)
+
+        if match is None:
+            self._text(candidate, events)
+            return
+
+        closing, name, attrs, self_closing = match.groups()
+        if self.tags is not None and name not in self.tags:
+            self._text(candidate, events)
+            return
+
+        if closing:
+            if name not in self.stack:
+                # a stray closing tag is just text
+                self._text(candidate, events)
+                return
+
+            while self.stack:
+                tag = self.stack.pop()
+                if self.whole:
+                    start = self._starts.pop()
+                    events.append((tag, "".join(self._captured[start:])))
+                    if not self.stack:
+                        self._captured = []
+                if tag == name:
+                    break
+            return
+
+        tag = Tag(name, parse_attributes(attrs), parent=self.current)
+        if self_closing:
+            events.append((tag, ""))
+            return
+
+        self.stack.append(tag)
+        if self.whole:
+            self._starts.append(len(self._captured))
+
+
+    def _text(self, text, events):
+        if not text:
+            return
+
+        if self.whole and self.stack:
+            self._captured.append(text)
+            return
+
+        # consecutive text for the same tag becomes one event, joined once
+        tag = self.current
+        if self._run is not None and self._run[0] == len(events) - 1 and events[-1][0] is tag:
+            self._run[1].append(text)
+        else:
+            self._flush_run(events)
+            events.append((tag, text))
+            self._run = (len(events) - 1, [text])
+
+
+    def _flush_run(self, events):
+        if self._run is not None:
+            index, pieces = self._run
+            if len(pieces) > 1:
+                events[index] = (events[index][0], "".join(pieces))
+            self._run = None
@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import CancelledError, Future
+
+from .completions import Completion
+
+
+def is_future(value):
+    return isinstance(value, (Future, Completion))
+
+
+def when_all(futures, fn):
+    """
+    Call fn() once every future in `futures` is done (immediately if there are none)
+    """
+    futures = list(futures)
+    if not futures:
+        fn()
+        return
+
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            ready = remaining[0] == 0
+        if ready:
+            fn()
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+
+def resolve(value):
+    if is_future(value):
+        return value.result()
+    return value
+
+
+def chain(inner, outer):
+    """
+    Copy the outcome of one done future into another
+    """
+    if inner.cancelled():
+        if not outer.cancel():
+            outer.set_exception(CancelledError())
+    elif inner.exception() is not None:
+        outer.set_exception(inner.exception())
+    else:
+        outer.set_result(inner.result())
+
+
+def submit_when_ready(executor, fn, *args, **kwargs):
+    """
+    Submit fn to the executor once any future/Completion arguments are done,
+    passing their results in their place. Returns a Future for fn's result.
+
+    Arguments are resolved before submitting, so only fn and plain values
+    are sent to the executor (which can then be a process pool).
+    """
+    result = Future()
+    pending = [v for v in (*args, *kwargs.values()) if is_future(v)]
+
+    def submit():
+        if not result.set_running_or_notify_cancel():
+            return
+        try:
+            resolved = [resolve(arg) for arg in args]
+            resolved_kwargs = {k: resolve(v) for k, v in kwargs.items()}
+            inner = executor.submit(fn, *resolved, **resolved_kwargs)
+        except Exception as e:
+            result.set_exception(e)
+            return
+        inner.add_done_callback(lambda inner: chain(inner, result))
+
+    when_all(pending, submit)
+    return result
+
+
+def tool(f=None, *, executor=None):
+    """
+    Mark an Agent method as a tool. Calling it returns a Future right away
+    and runs the method on the agent's tool pool (or `executor`).
+
+    Completion/Future arguments are awaited in the background, so a tool
+    can be started with a hole that is still streaming and will run as
+    soon as that hole finishes.
+    """
+    if f is None:
+        return lambda f: tool(f, executor=executor)
+
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        pool = executor or self.tool_pool
+        return submit_when_ready(pool, f, self, *args, **kwargs)
+
+    wrapper.is_lloam_tool = True
+    return wrapper
+
+
+async def _run_shell(command, cwd=None, timeout=None):
+    process = await asyncio.create_subprocess_shell(
+        command,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+
+    output = stdout if process.returncode == 0 else stderr
+    return output.decode(errors="replace")
+
+
+def shell(command, cwd=None, timeout=None):
+    """
+    Run a shell command as an asyncio subprocess on the completions loop.
+    `command` may be a Completion/Future, in which case it starts once it's done.
+    Returns a Future for stdout (or stderr if the command fails).
+    """
+    result = Future()
+
+    def submit():
+        try:
+            coro = _run_shell(resolve(command), cwd=cwd, timeout=timeout)
+        except Exception as e:
+            result.set_exception(e)
+            return
+        inner = asyncio.run_coroutine_threadsafe(coro, Completion.loop())
+        inner.add_done_callback(lambda inner: chain(inner, result))
+
+    when_all([command] if is_future(command) else [], submit)
+    return result
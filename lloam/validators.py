@@ -0,0 +1,66 @@
+import re
+
+
+class ValidationError(ValueError):
+    pass
+
+
+def regex():
+    # partial matching needs the regex package, which lloam doesn't depend on otherwise
+    try:
+        import regex
+    except ImportError:
+        raise ImportError("Validator(prefix=...) needs regex, install it with `pip install lloam[validate]`") from None
+    return regex
+
+
+class Validator:
+    """
+    Checks a hole's text while it streams. Calling a validator with the
+    text so far returns None if it's fine, or the reason it isn't.
+
+    :param prefix: A regex for the whole answer (e.g. `\\d+\\.\\d+`). While
+        streaming, the text only has to be the start of a possible match
+        (needs the `regex` package)
+    :param chars: The allowed characters, as the body of a regex character
+        class (e.g. `0-9.,`)
+    :param max_length: The most characters the text may have
+    """
+
+    def __init__(self, prefix=None, chars=None, max_length=None):
+        self.prefix = regex().compile(prefix, regex().DOTALL) if prefix is not None else None
+        self.chars = re.compile(f"[{chars}]*") if chars is not None else None
+        self.max_length = max_length
+
+
+    def __call__(self, text):
+        return self.check(text, len(text), lambda: text)
+
+
+    def check(self, new, length, text):
+        """
+        Check the text after it grew by `new` to `length` characters. Only
+        the new text is checked against `chars`, and `text()` (all of it) is
+        only read for `prefix`.
+        """
+        if self.max_length is not None and length > self.max_length:
+            return f"longer than {self.max_length} characters"
+
+        if self.chars is not None and not self.chars.fullmatch(new):
+            return f"contains characters outside [{self.chars.pattern[1:-2]}]"
+
+        if self.prefix is not None and length and not self.prefix.fullmatch(text(), partial=True):
+            return f"can't match {self.prefix.pattern}"
+
+        return None
+
+
+    def __repr__(self):
+        options = []
+        if self.prefix is not None:
+            options.append(f"prefix={self.prefix.pattern!r}")
+        if self.chars is not None:
+            options.append(f"chars={self.chars.pattern[1:-2]!r}")
+        if self.max_length is not None:
+            options.append(f"max_length={self.max_length}")
+        return f"Validator({', '.join(options)})"
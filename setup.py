@@ -7,6 +7,13 @@ setup(
     install_requires=[
         "openai>=1.51.0"
     ],
+    extras_require={
+        "embed": ["numpy"],
+        "validate": ["regex"],
+    },
+    entry_points={
+        "console_scripts": ["lloam=lloam.cli:main"],
+    },
     author="Lachlan Gray",
     description="A fertile collection of primitives for building things with LLMs",
     long_description=open('README.md').read(),
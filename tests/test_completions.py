@@ -0,0 +1,77 @@
+import asyncio
+from functools import partial
+
+import pytest
+
+import lloam
+from lloam.completions import RESET
+
+
+@pytest.fixture
+def restarting_backend():
+    """
+    A backend whose first attempt fails validation after streaming `<a>xy`
+    """
+    attempts = []
+
+    async def backend(messages, model="gpt-4o-mini", on_usage=None, **kwargs):
+        attempts.append(model)
+        chunks = ["<a>", "x", "y", "!!"] if len(attempts) == 1 else ["<b>", "ok", "</b>"]
+        for chunk in chunks:
+            await asyncio.sleep(0.02)
+            yield chunk
+
+    lloam.set_backend(backend)
+    yield attempts
+    lloam.set_backend(None)
+
+
+def restarting_completion():
+    return lloam.completion("Answer in tags", validate=lloam.Validator(chars="<>a-z/"), retries=1)
+
+
+def test_tags_start_over_when_completion_restarts(restarting_backend):
+    completion = restarting_completion()
+    events = [
+        event if event is RESET else (event[0].path, event[1])
+        for event in completion.tags(resets=True)
+    ]
+
+    assert len(restarting_backend) == 2
+    assert events == [(("a",), "x"), (("a",), "y"), RESET, (("b",), "ok")]
+
+
+def test_stream_resets_async(restarting_backend):
+    completion = restarting_completion()
+
+    async def consume():
+        return [chunk async for chunk in completion.stream(resets=True)]
+
+    chunks = asyncio.run(consume())
+    assert chunks[chunks.index(RESET) + 1:] == ["<b>", "ok", "</b>"]
+    assert completion.result() == "<b>ok</b>"
+
+
+def test_usage_unknown_when_stream_closed_early():
+    from lloam.stats import model_stats
+    from lloam.standin import StandinServer
+    from lloam.streaming import stream_chat_completion
+
+    model_stats.reset()
+    with StandinServer(reply="Paris. It is on the Seine.") as server:
+        lloam.set_backend(partial(stream_chat_completion, base_url=server.url, api_key="local"))
+        try:
+            whole = lloam.completion("Capital of France?")
+            stopped = lloam.completion("Capital of France?", stop=r" It")
+            whole.result(5), stopped.result(5)
+        finally:
+            lloam.set_backend(None)
+
+    assert whole.usage["prompt_tokens"] > 0
+    # the request was closed at the stop, before the provider reported usage
+    assert stopped.result() == "Paris."
+    assert stopped.usage == {"prompt_tokens": None, "cached_tokens": None, "completion_tokens": None}
+
+    report = model_stats.report()["gpt-4o-mini"]
+    assert report["usage_unreported"] == 1
+    assert report["prompt_tokens"] == whole.usage["prompt_tokens"]
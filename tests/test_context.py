@@ -0,0 +1,104 @@
+import asyncio
+import re
+import time
+
+import pytest
+
+import lloam
+
+
+@pytest.fixture
+def failing_backend():
+    async def backend(messages, model="gpt-4o-mini", on_usage=None, **kwargs):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("summarizer is down")
+        yield
+
+    lloam.set_backend(backend)
+    yield
+    lloam.set_backend(None)
+
+
+@pytest.fixture
+def summaries():
+    """
+    A backend that answers every summary prompt with a 15 character summary
+    """
+    prompts = []
+
+    async def backend(messages, model="gpt-4o-mini", on_usage=None, **kwargs):
+        prompts.append(messages)
+        await asyncio.sleep(0.01)
+        yield f"summary {len(prompts):>6}"
+
+    lloam.set_backend(backend)
+    yield prompts
+    lloam.set_backend(None)
+
+
+def wait_for_summary(context, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        with context._lock:
+            if context._summarizing is None:
+                return
+        assert time.monotonic() < deadline, "summary never finished"
+        time.sleep(0.01)
+
+
+def summaries_in(context):
+    return [entry["text"] for entry in context._entries if entry["summary"]]
+
+
+def test_window_keeps_budget():
+    context = lloam.Context(max_tokens=20, counter=len, separator="")
+    context.extend(["aaaaa", "bbbbb", "ccccc", "ddddd", "eeeee"])
+
+    assert str(context) == "bbbbbcccccdddddeeeee"
+    assert context.tokens == 20
+    assert context.evicted == 1
+
+
+def test_failed_summary_keeps_recent_history(failing_backend):
+    context = lloam.Context(max_tokens=30, policy="summarize", counter=len, separator="")
+    context.extend(["line one\nline two", "b" * 10, "c" * 10])
+    wait_for_summary(context)
+
+    assert context.summary_errors == 1
+    assert isinstance(context.last_summary_error, RuntimeError)
+
+    # the evicted entry's last line fits in the budget, so it's kept instead of a summary
+    assert list(context) == ["line two", "b" * 10, "c" * 10]
+    assert context.tokens <= context.max_tokens
+
+
+def test_summary_survives_steady_appends(summaries):
+    context = lloam.Context(max_tokens=100, policy="summarize", counter=len, separator="")
+    for i in range(20):
+        context.append(f"step {i:>2} " + "." * 12)
+        wait_for_summary(context)
+
+        assert context.tokens <= context.max_tokens
+        if i >= 5:
+            # the summary is kept, and older steps are evicted to make room for it
+            assert len(summaries_in(context)) == 1
+            assert list(context)[0].startswith("summary")
+
+    entries = list(context)
+    assert entries[-1] == "step 19 ............"
+    assert len(entries) == 5
+    # each summary folds in the one before it
+    assert re.search(r"summary +\d+", str(summaries[-1]))
+
+
+def test_summary_with_burst_of_appends(summaries):
+    context = lloam.Context(max_tokens=100, policy="summarize", keep_first=1, counter=len, separator="")
+    context.append("task: dig a hole")
+    context.extend(f"step {i:>2} " + "." * 12 for i in range(30))
+    wait_for_summary(context)
+
+    entries = list(context)
+    assert entries[0] == "task: dig a hole"
+    assert entries[1].startswith("summary")
+    assert entries[-1] == "step 29 ............"
+    assert context.tokens <= context.max_tokens
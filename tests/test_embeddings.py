@@ -0,0 +1,136 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from lloam import embeddings
+from lloam.embeddings import Embedder, openai_embeddings
+from lloam.index import VectorIndex
+from lloam.standin import StandinServer, embedding
+
+
+DOCUMENTS = [
+    "Loam is a fertile mix of sand, silt and clay.",
+    "Clay soils hold water and drain slowly.",
+    "Sandy soils drain quickly.",
+    "The capital of France is Paris.",
+]
+
+
+@pytest.fixture
+def requests():
+    """
+    Use a deterministic backend for lloam.embed, and record the size of each request
+    """
+    sizes = []
+
+    async def backend(texts, model):
+        sizes.append(len(texts))
+        await asyncio.sleep(0.01)
+        return np.array([embedding(text) for text in texts], dtype=np.float32)
+
+    embeddings.set_backend(backend)
+    yield sizes
+    embeddings.set_backend(None)
+
+
+@pytest.fixture
+def standin():
+    with StandinServer() as server:
+        embeddings.set_backend(partial(openai_embeddings, base_url=server.url, api_key="local"))
+        yield server
+        embeddings.set_backend(None)
+
+
+def test_concurrent_calls_are_batched(requests):
+    embedder = Embedder(max_delay=0.05)
+    texts = [f"text number {i}" for i in range(100)]
+
+    with ThreadPoolExecutor(16) as pool:
+        futures = list(pool.map(embedder.embed, texts))
+    vectors = [future.result(5) for future in futures]
+
+    assert embedder.calls == 100
+    assert embedder.inputs == 100
+    assert embedder.requests == len(requests) <= 2
+    assert sum(requests) == 100
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, embedding(text), rtol=1e-6)
+
+
+def test_large_batches_are_split(requests):
+    embedder = Embedder(max_batch=8)
+    vectors = embedder.embed([f"text number {i}" for i in range(20)]).result(5)
+
+    assert vectors.shape == (20, 64)
+    assert sorted(requests, reverse=True) == [8, 8, 4]
+    np.testing.assert_allclose(vectors[13], embedding("text number 13"), rtol=1e-6)
+
+
+def test_standin_embeddings_endpoint(standin):
+    vectors = embeddings.embed(DOCUMENTS, model="standin-test").result(5)
+
+    assert standin.embedding_inputs == len(DOCUMENTS)
+    np.testing.assert_allclose(vectors, [embedding(text) for text in DOCUMENTS], rtol=1e-6)
+
+
+def test_search_order_and_scores():
+    index = VectorIndex(dim=3)
+    index.add(["x", "xy", "y", "-x"], vectors=[[1, 0, 0], [1, 1, 0], [0, 1, 0], [-1, 0, 0]])
+
+    matches = index.search([2, 0, 0], k=3)
+    assert matches.items == ["x", "xy", "y"]
+    np.testing.assert_allclose(matches.scores, [1.0, 2 ** -0.5, 0.0], atol=1e-6)
+
+    # k larger than the index
+    assert index.search([-1, 0, 0], k=10).items == ["-x", "y", "xy", "x"]
+
+
+def test_search_texts(standin):
+    index = VectorIndex(model="standin-test")
+    index.add(DOCUMENTS)
+
+    matches = index.search("what are clay soils?", k=2)
+    assert matches.items[0] == DOCUMENTS[1]
+    assert matches.scores[0] >= matches.scores[1]
+    assert str(index.query("Paris, France", k=1).result(5)) == DOCUMENTS[3]
+
+
+def test_index_grows_past_capacity():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+
+    index = VectorIndex(capacity=4)
+    for i in range(0, 50, 7):
+        index.add([f"doc {j}" for j in range(i, min(i + 7, 50))], vectors=vectors[i:i + 7])
+
+    assert len(index) == 50
+    for i in (0, 3, 4, 49):
+        assert index.search(vectors[i], k=1).items == [f"doc {i}"]
+
+
+def test_memmap_index_reopens(tmp_path):
+    path = str(tmp_path / "index.f32")
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(30, 16)).astype(np.float32)
+    queries = rng.normal(size=(5, 16)).astype(np.float32)
+
+    index = VectorIndex(path=path, capacity=8)
+    index.add([f"doc {i}" for i in range(30)], vectors=vectors)
+    before = [index.search(query, k=5) for query in queries]
+    index.flush()
+
+    reopened = VectorIndex(path=path)
+    assert len(reopened) == 30
+    assert reopened.dim == 16
+    for query, matches in zip(queries, before):
+        again = reopened.search(query, k=5)
+        assert again.items == matches.items
+        np.testing.assert_allclose(again.scores, matches.scores, rtol=1e-6)
+
+    # and it keeps growing from where it left off
+    reopened.add(["new"], vectors=queries[:1])
+    assert reopened.search(queries[0], k=1).items == ["new"]
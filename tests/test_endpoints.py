@@ -0,0 +1,191 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from lloam.endpoints import Endpoint, EndpointPool, NoEndpointAvailable
+from lloam.standin import StandinServer
+from lloam.streaming import stream_chat_completion
+
+
+REPLY = "Loam is a fertile mix of sand, silt and clay."
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**options):
+        options.setdefault("reply", REPLY)
+        server = StandinServer(**options).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def endpoint(server, name):
+    return Endpoint(server.url, api_key="local", name=name)
+
+
+def ask(pool, content="What's loam?"):
+    async def run():
+        messages = [{"role": "user", "content": content}]
+        return "".join([chunk async for chunk in pool.stream(messages)])
+    return asyncio.run(run())
+
+
+def ask_all(pool, count):
+    async def one():
+        return "".join([chunk async for chunk in pool.stream([{"role": "user", "content": "What's loam?"}])])
+
+    async def run():
+        return await asyncio.gather(*(one() for _ in range(count)))
+    return asyncio.run(run())
+
+
+def test_least_outstanding_relative_to_weight():
+    a, b, c = Endpoint("http://a/v1"), Endpoint("http://b/v1"), Endpoint("http://c/v1", weight=2)
+    pool = EndpointPool([a, b, c])
+
+    a.outstanding, b.outstanding, c.outstanding = 1, 0, 1
+    assert pool.select() is b
+
+    b.outstanding = 2
+    # (1 + 1) / 2 beats (1 + 1) / 1
+    assert pool.select() is c
+    assert pool.select(exclude={c}) is a
+
+
+def test_concurrent_requests_are_spread(servers):
+    a, b = servers(token_delay=0.01), servers(token_delay=0.01)
+    pool = EndpointPool([endpoint(a, "a"), endpoint(b, "b")])
+
+    assert ask_all(pool, 10) == [REPLY] * 10
+    assert a.requests == b.requests == 5
+    assert all(e.outstanding == 0 for e in pool.endpoints)
+
+
+def test_latency_strategy_prefers_fast_endpoint(servers):
+    fast, slow = servers(), servers(ttft=0.2)
+    pool = EndpointPool([endpoint(slow, "slow"), endpoint(fast, "fast")], strategy="latency")
+
+    # one request each to measure them
+    ask_all(pool, 2)
+    assert slow.requests == fast.requests == 1
+    assert pool.endpoints[0].ttft > pool.endpoints[1].ttft
+
+    for _ in range(5):
+        ask(pool)
+    assert slow.requests == 1
+    assert fast.requests == 6
+
+
+def test_circuit_opens_and_half_open_trial(servers):
+    flaky = servers(fail=True)
+    pool = EndpointPool([endpoint(flaky, "flaky")], failure_threshold=2, cooldown=0.2)
+    e = pool.endpoints[0]
+
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            ask(pool)
+    assert e.state(pool.cooldown) == "open"
+
+    # skipped while open
+    with pytest.raises(NoEndpointAvailable):
+        ask(pool)
+    assert flaky.requests == 2
+
+    time.sleep(0.25)
+    assert e.state(pool.cooldown) == "half-open"
+    flaky.fail = False
+    flaky.ttft = 0.2
+
+    async def trial():
+        async def request():
+            return "".join([chunk async for chunk in pool.stream([{"role": "user", "content": "hi"}])])
+
+        task = asyncio.ensure_future(request())
+        await asyncio.sleep(0.1)
+        # only one request gets through while half-open
+        assert e._trial
+        assert pool.select() is None
+        assert await task == REPLY
+
+    asyncio.run(trial())
+    assert e.state(pool.cooldown) == "closed"
+    assert e.consecutive_failures == 0
+    assert ask(pool) == REPLY
+
+
+def test_failed_half_open_trial_reopens(servers):
+    flaky = servers(fail=True)
+    pool = EndpointPool([endpoint(flaky, "flaky")], failure_threshold=2, cooldown=0.2)
+    e = pool.endpoints[0]
+
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            ask(pool)
+
+    time.sleep(0.25)
+    with pytest.raises(openai.InternalServerError):
+        ask(pool)
+    assert e.state(pool.cooldown) == "open"
+    assert not e._trial
+
+
+def test_failover_before_first_chunk(servers):
+    broken, fast = servers(fail=True), servers()
+    pool = EndpointPool([endpoint(broken, "broken"), endpoint(fast, "fast")])
+
+    assert ask(pool) == REPLY
+    assert broken.requests == 1
+    assert fast.requests == 1
+    assert pool.endpoints[0].failures == 1
+    assert pool.endpoints[1].failures == 0
+
+
+def test_no_failover_after_streaming(servers):
+    a, b = servers(), servers()
+
+    async def drops_connection(*args, **kwargs):
+        async for chunk in stream_chat_completion(*args, **kwargs):
+            yield chunk
+            raise ConnectionError("connection dropped")
+
+    pool = EndpointPool([endpoint(a, "a"), endpoint(b, "b")], stream_fn=drops_connection)
+
+    chunks = []
+
+    async def run():
+        async for chunk in pool.stream([{"role": "user", "content": "What's loam?"}]):
+            chunks.append(chunk)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+    # the caller already has part of the output, so it isn't sent again
+    assert chunks == ["Loam"]
+    assert a.requests + b.requests == 1
+    assert sum(e.failures for e in pool.endpoints) == 1
+
+
+def test_client_errors_dont_open_circuits(servers):
+    a, b = servers(context_window=50), servers(context_window=50)
+    pool = EndpointPool([endpoint(a, "a"), endpoint(b, "b")], failure_threshold=2, cooldown=60)
+
+    for _ in range(3):
+        with pytest.raises(openai.BadRequestError):
+            ask(pool, "loam " * 200)
+
+    # each oversized request was sent once, and counted against nobody
+    assert a.requests + b.requests == 3
+    for e in pool.endpoints:
+        assert e.state(pool.cooldown) == "closed"
+        assert e.failures == 0
+        assert e.outstanding == 0
+
+    assert ask(pool) == REPLY
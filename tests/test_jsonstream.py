@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import lloam
+from lloam.completions import CompletionStatus
+from lloam.jsonstream import JSONParser, JSONStreamError
+
+
+DOCUMENT = {
+    "name": "loam",
+    "parts": ["sand", "silt", "clay"],
+    "ratio": {"sand": 0.4, "silt": 0.4, "clay": 0.2},
+    "fertile": True,
+    "notes": None,
+    "quote": "say \"hi\" \\ é",
+}
+
+
+def feed_all(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_parses_any_chunking(size):
+    text = json.dumps(DOCUMENT)
+    parser = JSONParser()
+    events = feed_all(parser, [text[i:i + size] for i in range(0, len(text), size)])
+
+    assert parser.done
+    assert parser.root == DOCUMENT
+    assert dict(events)[("ratio", "clay")] == 0.2
+    assert dict(events)[("parts", 1)] == "silt"
+    # containers close after their contents, the document last
+    assert events[-1] == ((), DOCUMENT)
+
+
+def test_values_are_reported_when_they_close():
+    parser = JSONParser()
+    assert parser.feed('{"a": "hel') == []
+    assert parser.partial == {"a": "hel"}
+    assert parser.feed('lo", "b": 1') == [(("a",), "hello")]
+    # a number isn't done until something follows it
+    assert parser.feed("2") == []
+    assert parser.feed("}") == [(("b",), 12), ((), {"a": "hello", "b": 12})]
+
+
+def test_text_around_the_document():
+    parser = JSONParser()
+    feed_all(parser, ["Sure!\n```json\n", '{"ok": true}', "\n```"])
+    assert parser.root == {"ok": True}
+
+    with pytest.raises(JSONStreamError):
+        JSONParser(strict=True).feed("Sure! {}")
+
+
+@pytest.mark.parametrize("text", ['{"a": x}', '{"a" 1}', '[1, 2,, 3]', '{"a": tru }', '{"a": 1]'])
+def test_malformed_json_fails_at_first_bad_character(text):
+    with pytest.raises(JSONStreamError):
+        feed_all(JSONParser(), list(text))
+
+
+def test_incomplete_document():
+    parser = JSONParser()
+    parser.feed('{"a": [1, 2')
+    with pytest.raises(JSONStreamError):
+        parser.close()
+
+
+@pytest.fixture
+def chunks():
+    """
+    Set the chunks the backend streams, and record which were read
+    """
+    streamed = {"chunks": [], "read": []}
+
+    async def backend(messages, model="gpt-4o-mini", on_usage=None, **kwargs):
+        # time to attach a JSONStream before anything streams
+        await asyncio.sleep(0.05)
+        for chunk in streamed["chunks"]:
+            streamed["read"].append(chunk)
+            yield chunk
+
+    lloam.set_backend(backend)
+    yield streamed
+    lloam.set_backend(None)
+
+
+def test_fields_and_result(chunks):
+    chunks["chunks"] = ['{"color": "yel', 'low", "taste": ', '"sweet"}']
+    fruit = lloam.completion("Describe a mango").json()
+    colors = []
+    fruit.on_field("color", colors.append)
+
+    assert fruit.field("taste").result(5) == "sweet"
+    assert fruit.result(5) == {"color": "yellow", "taste": "sweet"}
+    assert colors == ["yellow"]
+
+
+def test_generation_stops_when_document_is_complete(chunks):
+    chunks["chunks"] = ['{"a": 1}', "\nHope that", " helps!", " Anything else?"]
+    completion = lloam.completion("json")
+    document = completion.json()
+
+    assert document.result(5) == {"a": 1}
+    assert completion.result() == '{"a": 1}'
+    assert chunks["read"] == ['{"a": 1}']
+
+
+def test_malformed_output_stops_the_stream(chunks):
+    # no await between chunks, so the cancellation lands mid-stream
+    chunks["chunks"] = ['{"a": x', "yz", '"}']
+    completion = lloam.completion("json")
+    document = completion.json()
+    transitions = []
+    completion.subscribe(lambda c, old, new: transitions.append(new))
+
+    with pytest.raises(JSONStreamError):
+        document.result(5)
+    with pytest.raises(JSONStreamError):
+        document.field("a").result(5)
+    time.sleep(0.1)
+
+    assert completion.status == CompletionStatus.ERROR
+    assert CompletionStatus.FINISHED not in transitions
+    assert chunks["read"] == ['{"a": x']
+    assert completion.chunks == ['{"a": x']
+    with pytest.raises(JSONStreamError):
+        completion.result()
+
+
+def test_missing_field(chunks):
+    chunks["chunks"] = ['{"a": 1}']
+    document = lloam.completion("json").json()
+
+    with pytest.raises(KeyError):
+        document.field("b").result(5)
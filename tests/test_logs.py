@@ -0,0 +1,111 @@
+import io
+import json
+import threading
+
+from lloam.logs import Logger
+
+
+class BlockingSink(io.StringIO):
+    """
+    A stream whose writes wait until `release` is set
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.writing.set()
+        self.release.wait(5)
+        return super().write(text)
+
+
+class FailingSink(io.StringIO):
+    """
+    A stream whose first write fails
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failed = False
+
+    def write(self, text):
+        if not self.failed:
+            self.failed = True
+            raise OSError("disk full")
+        return super().write(text)
+
+
+def written(sink):
+    return [json.loads(line)["message"] for line in sink.getvalue().splitlines()]
+
+
+def test_level_filtering():
+    sink = io.StringIO()
+    logger = Logger(level="warning", sink=sink, echo=False)
+    logger.log("quiet", level="debug")
+    logger.log("chatter")
+    logger.log("careful", level="warning")
+    logger.log("broken", level="error")
+    logger.log("unknown levels count as info", level="verbose")
+    logger.close()
+
+    assert [record["message"] for record in logger.records] == ["careful", "broken"]
+    assert written(sink) == ["careful", "broken"]
+
+
+def test_ring_buffer_keeps_newest():
+    logger = Logger(capacity=3, echo=False)
+    for i in range(5):
+        logger.log(f"record {i}")
+
+    assert [record["message"] for record in logger.records] == ["record 2", "record 3", "record 4"]
+    assert logger.overflowed == 2
+
+
+def test_records_dropped_while_writer_is_behind():
+    sink = BlockingSink()
+    logger = Logger(sink=sink, echo=False, max_pending=3)
+    logger.log("first")
+    assert sink.writing.wait(5)
+
+    for i in range(10):
+        logger.log(f"record {i}")
+    assert logger.dropped == 7
+
+    sink.release.set()
+    assert logger.flush(5)
+    assert written(sink) == ["first", "record 0", "record 1", "record 2"]
+    # dropped records are still kept in memory
+    assert len(logger.records) == 11
+    logger.close()
+
+
+def test_flush_and_close_write_everything():
+    sink = io.StringIO()
+    logger = Logger(sink=sink, echo=False, batch_size=7)
+    for i in range(50):
+        logger.log(f"record {i}")
+    assert logger.flush(5)
+    assert len(written(sink)) == 50
+
+    for i in range(50, 100):
+        logger.log(f"record {i}")
+    logger.close()
+    assert written(sink) == [f"record {i}" for i in range(100)]
+
+
+def test_writer_survives_sink_errors():
+    sink = FailingSink()
+    logger = Logger(sink=sink, echo=False)
+    logger.log("lost")
+    assert logger.flush(5)
+
+    logger.log("kept")
+    assert logger.flush(5)
+    logger.close()
+
+    assert logger.errors == 1
+    assert isinstance(logger.last_error, OSError)
+    assert written(sink) == ["kept"]
@@ -0,0 +1,47 @@
+import threading
+
+from lloam.completions import Completion, CompletionStatus
+from lloam.progress import ProgressRegistry, format_counts
+
+
+def test_counts_follow_transitions():
+    registry = ProgressRegistry()
+    completions = [Completion("hi") for _ in range(3)]
+    for completion in completions:
+        registry.track(completion, "step")
+
+    completions[0].status = CompletionStatus.RUNNING
+    completions[1].status = CompletionStatus.RUNNING
+    completions[1].status = CompletionStatus.FINISHED
+
+    _, snapshot = registry.snapshot()
+    assert snapshot["step"] == {
+        CompletionStatus.PENDING: 1,
+        CompletionStatus.RUNNING: 1,
+        CompletionStatus.FINISHED: 1,
+        CompletionStatus.ERROR: 0,
+    }
+    assert format_counts(snapshot, width=6) == ["step ■■□□□□ 1/3 (1 running)"]
+
+
+def test_tracking_completions_that_are_already_moving():
+    registry = ProgressRegistry()
+    completions = [Completion("hi") for _ in range(2000)]
+    start = threading.Barrier(2)
+
+    def run():
+        start.wait()
+        for completion in completions:
+            completion.status = CompletionStatus.RUNNING
+            completion.status = CompletionStatus.FINISHED
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    start.wait()
+    for completion in completions:
+        registry.track(completion, "step")
+    thread.join()
+
+    totals = registry.totals()
+    assert totals[CompletionStatus.FINISHED] == len(completions)
+    assert sum(totals.values()) == len(completions)
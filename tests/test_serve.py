@@ -0,0 +1,150 @@
+import http.client
+import json
+import socket
+import time
+from contextlib import contextmanager
+from functools import partial
+
+import pytest
+
+import lloam
+from lloam.serve import PromptServer
+from lloam.standin import StandinServer
+from lloam.streaming import stream_chat_completion
+
+
+@lloam.prompt
+def capital(country):
+    """
+    The capital of {country} is [city]. It is on the river [river].
+    """
+
+
+def broken(country):
+    raise RuntimeError("prompt exploded")
+
+
+@contextmanager
+def serving(max_concurrent=16, max_pending=64, **standin):
+    """
+    A PromptServer for `capital` and `broken`, backed by a StandinServer
+    """
+    with StandinServer(**standin) as backend:
+        lloam.set_backend(partial(stream_chat_completion, base_url=backend.url, api_key="local"))
+        try:
+            server = PromptServer([capital, broken], port=0, max_concurrent=max_concurrent, max_pending=max_pending)
+            with server:
+                yield server, backend
+        finally:
+            lloam.set_backend(None)
+
+
+def post(server, path, args):
+    connection = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    connection.request("POST", path, json.dumps(args), {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, response.read().decode()
+
+
+def events(text):
+    parsed = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        parsed.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return parsed
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def open_request(server, path="/capital", body=b'{"country": "France"}'):
+    client = socket.create_connection((server.host, server.port))
+    client.sendall(
+        f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    return client
+
+
+def test_events_arrive_in_order():
+    with serving(reply="Paris and Seine") as (server, _):
+        status, body = post(server, "/capital", {"country": "France"})
+
+    assert status == 200
+    names = [event for event, _ in events(body)]
+    assert names[0] == "hole" and names[-1] == "end"
+    assert names.index("done") < names.index("hole", 1)
+
+    first, second = names.index("hole"), names.index("hole", 1)
+    tokens = [data["text"] for event, data in events(body)[first:second] if event == "token"]
+    assert "".join(tokens) == "Paris and Seine"
+    assert events(body)[-1][1] == {"holes": {"city": "Paris and Seine", "river": "Paris and Seine"}}
+
+
+def test_without_streaming():
+    with serving(reply="Paris") as (server, _):
+        status, body = post(server, "/capital?stream=false", {"country": "France"})
+        assert server.served == 1
+
+    assert status == 200
+    assert json.loads(body) == {"holes": {"city": "Paris", "river": "Paris"}}
+
+
+def test_disconnect_cancels_the_prompt():
+    with serving(reply="word " * 100, token_delay=0.05) as (server, backend):
+        client = open_request(server)
+        wait_until(lambda: backend.active == 1)
+        client.close()
+
+        wait_until(lambda: server.cancelled == 1)
+        # the hole's request to the backend is closed too
+        wait_until(lambda: backend.active == 0)
+        assert server.served == 0
+
+
+def test_admission_limit():
+    with serving(max_concurrent=1, max_pending=0, reply="word " * 100, token_delay=0.05) as (server, _):
+        client = open_request(server)
+        wait_until(lambda: server.active == 1)
+
+        status, body = post(server, "/capital", {"country": "Spain"})
+        client.close()
+
+        assert status == 429
+        assert server.rejected == 1
+
+
+@pytest.mark.parametrize("request_bytes, status", [
+    (b"POST /capital HTTP/1.1\r\nContent-Length: lots\r\n\r\n", 400),
+    (b"POST /capital HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+    (b"GARBAGE\r\n\r\n", 400),
+    (b'POST /broken HTTP/1.1\r\nContent-Length: 15\r\n\r\n{"country": ""}', 500),
+])
+def test_errors_get_a_response(request_bytes, status, caplog):
+    with serving() as (server, _):
+        client = socket.create_connection((server.host, server.port))
+        client.sendall(request_bytes)
+        reply = client.makefile("rb").read().decode()
+        client.close()
+
+        assert reply.startswith(f"HTTP/1.1 {status} ")
+        # the server keeps serving
+        assert post(server, "/capital?stream=false", {"country": "France"})[0] == 200
+    assert not [record for record in caplog.records if record.name == "asyncio"]
+
+
+def test_standin_survives_empty_request(caplog):
+    with StandinServer() as backend:
+        client = socket.create_connection((backend.host, backend.port))
+        client.sendall(b"\r\n")
+        client.close()
+        wait_until(lambda: backend.active == 0)
+
+        connection = http.client.HTTPConnection(backend.host, backend.port, timeout=10)
+        connection.request("POST", "/v1/embeddings", json.dumps({"input": "loam"}))
+        assert connection.getresponse().status == 200
+    # the handler didn't crash
+    assert not [record for record in caplog.records if record.name == "asyncio"]
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+import lloam
+from lloam.completions import Completion
+
+
+@pytest.fixture
+def backend():
+    async def backend(messages, model="gpt-4o-mini", on_usage=None, **kwargs):
+        for chunk in ["total ", "0"]:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    lloam.set_backend(backend)
+    yield
+    lloam.set_backend(None)
+
+
+class Shell(lloam.Agent):
+    # doesn't call Agent.__init__
+    def __init__(self):
+        self.steps = []
+
+    def next_step(self, output):
+        self.steps.append((output, asyncio._get_running_loop()))
+        return Completion(f"$ ls\n{output}")
+
+
+def test_hit_keeps_speculative_step():
+    agent = Shell()
+    observation = Future()
+
+    step = agent.speculate(observation, agent.next_step, predict="")
+    observation.set_result("")
+
+    assert step.result(5).prompt == "$ ls\n"
+    assert len(agent.steps) == 1
+    assert agent.speculation_stats.report()["hits"] == 1
+
+
+def test_miss_restarts_off_the_completions_loop(backend):
+    agent = Shell()
+    observation = lloam.completion("ls -l")
+
+    step = agent.speculate(observation, agent.next_step, predict="nothing")
+
+    assert step.result(5).prompt == "$ ls\ntotal 0"
+    (predicted, _), (actual, loop) = agent.steps
+    assert (predicted, actual) == ("nothing", "total 0")
+    # the observation's done callback runs on the completions loop, the new step doesn't
+    assert loop is None
+
+    report = agent.speculation_stats.report()
+    assert (report["hits"], report["misses"]) == (0, 1)
+
+
+def test_agent_state_is_created_once():
+    agent = Shell()
+    assert agent.logger is agent.logger
+    assert agent.progress is agent.progress
+    assert agent.tool_pool is agent.tool_pool
+    assert Shell.progress.__doc__.strip().startswith("Registry")
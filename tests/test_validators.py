@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+import lloam
+from lloam.validators import Validator
+
+
+def test_prefix_accepts_the_start_of_a_match():
+    validator = Validator(prefix=r"\d+\.\d+")
+
+    for text in ["", "3", "3.", "3.14"]:
+        assert validator(text) is None
+    assert validator("3.x") is not None
+    assert validator("x") is not None
+
+
+def test_chars_and_length_checked_incrementally():
+    validator = Validator(chars="0-9", max_length=4)
+
+    assert validator.check("12", 4, lambda: pytest.fail("text isn't needed")) is None
+    assert validator.check("1a", 4, lambda: "121a") is not None
+    assert validator.check("1", 5, lambda: "12345") is not None
+
+
+@pytest.fixture
+def chunks():
+    streamed = {"chunks": []}
+
+    async def backend(messages, model="gpt-4o-mini", on_usage=None, **kwargs):
+        await asyncio.sleep(0.01)
+        for chunk in streamed["chunks"]:
+            yield chunk
+
+    lloam.set_backend(backend)
+    yield streamed
+    lloam.set_backend(None)
+
+
+@pytest.mark.parametrize("streamed", [["12."], ["1", "2", "."], ["12", ". Or so"]])
+def test_hole_validates_text_before_the_stop(chunks, streamed):
+    chunks["chunks"] = streamed
+
+    @lloam.prompt
+    def age(thing):
+        r"""
+        How many years old is {thing}? [years(chars=0-9 max=12 retries=2):\.]
+        """
+
+    prompt = age("the oak")
+    assert prompt.future("years").result(5) == "12"
+    assert prompt.future("years").attempts == 0
+
+
+def test_length_starts_over_with_each_attempt(chunks):
+    attempts = iter([["abc", "de"], ["abc"]])
+    lloam.set_backend(lambda messages, **kwargs: stream(next(attempts)))
+
+    async def stream(streamed):
+        for chunk in streamed:
+            yield chunk
+
+    completion = lloam.completion("letters", validate=Validator(max_length=4), retries=1)
+    assert completion.result(5) == "abc"
+    assert completion.attempts == 1